@@ -0,0 +1,146 @@
+import asyncio
+from urllib.parse import quote
+
+import aiohttp
+
+from Util.normalization import normalize_name
+
+
+class AsyncMySpotify:
+    """
+    asyncio flavour of the MySpotify helpers.
+
+    Requests go through a single pooled keep-alive aiohttp session and at most
+    `max_concurrency` of them are in flight at once. Paged endpoints read the
+    first page, then fetch every remaining offset concurrently; results are
+    always returned in the same order as the blocking MySpotify helpers.
+
+    `base_url` can point to any server that speaks the Spotify Web API, which
+    is how the client is exercised against a local fake server.
+
+    Usage:
+        async with AsyncMySpotify(access_token) as spo:
+            tr_ids, tr_names = await spo.get_liked_songs()
+    """
+
+    def __init__(self, access_token, base_url='https://api.spotify.com/v1/', max_concurrency=10,
+                 pool_size=20, market='FR', max_retries=5):
+        self.access_token = access_token
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.market = market
+        self.max_retries = max_retries
+        self.session = None
+        self.semaphore = None
+        self.user_id = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        # The semaphore and session must be created inside the running loop
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Authorization': f'Bearer {self.access_token}'},
+                raise_for_status=False,
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, path, **params):
+        """GET an API path (or a full URL) and return the decoded JSON body."""
+        await self.open()
+        url = path if path.startswith('http') else self.base_url + path
+        params = {key: str(value) for key, value in params.items() if value is not None}
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore:
+                async with self.session.get(url, params=params) as response:
+                    if response.status == 429 and attempt < self.max_retries:
+                        retry_after = float(response.headers.get('Retry-After', 1))
+                    else:
+                        response.raise_for_status()
+                        return await response.json()
+            # Sleep outside the semaphore so other requests keep flowing
+            await asyncio.sleep(retry_after)
+
+    async def get_all_pages(self, path, limit, **params):
+        """Fetch every item of a paged endpoint, requesting all pages after the first concurrently."""
+        first = await self.get(path, limit=limit, offset=0, **params)
+        pages = await asyncio.gather(*[
+            self.get(path, limit=limit, offset=offset, **params)
+            for offset in range(limit, first['total'], limit)
+        ])
+        items = list(first['items'])
+        for page in pages:
+            items.extend(page['items'])
+        return items
+
+    def chunks(self, foo, n):
+        """Yield successive n-sized chunks from foo."""
+        for i in range(0, len(foo), n):
+            yield foo[i:i + n]
+
+    def normalize_name(self, foo):
+        return normalize_name(foo)
+
+    async def me(self):
+        return await self.get('me')
+
+    async def get_user_id(self):
+        if self.user_id is None:
+            self.user_id = (await self.me())['id']
+        return self.user_id
+
+    async def ars_from_ids(self, ids):
+        results = await asyncio.gather(*[
+            self.get('artists', ids=','.join(chunk)) for chunk in self.chunks(ids, 50)
+        ])
+        artists = []
+        for result in results:
+            artists.extend(result['artists'])
+        return artists
+
+    async def get_liked_songs(self):
+        tr = await self.get_all_pages('me/tracks', 50)
+        tr_ids = [i['track']['id'] for i in tr]
+        tr_names = [i['track']['name'] for i in tr]
+        return tr_ids, tr_names
+
+    async def get_user_playlist_names_and_ids(self, user_id=False):
+        if not user_id:
+            user_id = await self.get_user_id()
+        playlists = await self.get_all_pages(f'users/{quote(user_id, safe="")}/playlists', 50)
+        pl_ids = [i['id'] for i in playlists]
+        pl_names = [i['name'] for i in playlists]
+        return pl_ids, pl_names
+
+    async def pl_tr(self, pl_id):
+        pl_tr = await self.get_all_pages(f'playlists/{pl_id}/tracks', 100, market=self.market)
+        pl_tr = [i for i in pl_tr if i['track'] != None]
+        pl_tr = [i for i in pl_tr if i['track']['id'] != None]
+        return pl_tr
+
+    async def pl_tr_names(self, pl_id):
+        pl_tr = await self.pl_tr(pl_id)
+        return [self.normalize_name(i['track']['name']) for i in pl_tr]
+
+    async def pl_tr_ids(self, pl_id):
+        pl_tr = await self.pl_tr(pl_id)
+        return [i['track']['id'] for i in pl_tr]
+
+    async def pl_tr_names_and_ids(self, pl_id):
+        pl_tr = await self.pl_tr(pl_id)
+        tr_names = [self.normalize_name(i['track']['name']) for i in pl_tr]
+        tr_ids = [i['track']['id'] for i in pl_tr]
+        return tr_names, tr_ids
@@ -0,0 +1,268 @@
+import json
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+from Util.tracks import DEFAULT_ALBUM_GROUPS, Album, Track
+
+
+class DiscographyCache:
+    """
+    Local SQLite cache of artist -> albums -> tracks, plus the resolution of
+    artist names to Spotify IDs.
+
+    Artists older than `ttl` seconds are reported as missing so they get
+    crawled again. Each artist remembers which artist_albums groups were
+    crawled, and serves any request for a subset of them. Resolved names do not expire; pinned names are never
+    overwritten by a search result. Every call opens its own connection, so a
+    single cache can be shared by the worker threads of a FeaturingsFinder.
+    """
+
+    # Bump whenever the discography tables change: their old content is simply dropped
+    SCHEMA_VERSION = 4
+
+    def __init__(self, path='discography_cache.sqlite', ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.create_tables()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_tables(self):
+        with closing(self.connect()) as conn, conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.executescript("""
+                    DROP TABLE IF EXISTS artists;
+                    DROP TABLE IF EXISTS albums;
+                    DROP TABLE IF EXISTS tracks;
+                """)
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS artists (
+                    artist_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    album_groups TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS albums (
+                    artist_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    album_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    release_date TEXT NOT NULL,
+                    album_group TEXT NOT NULL,
+                    PRIMARY KEY (artist_id, position)
+                );
+                CREATE TABLE IF NOT EXISTS tracks (
+                    artist_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    track_id TEXT,
+                    name TEXT NOT NULL,
+                    artist_ids TEXT NOT NULL,
+                    artist_names TEXT NOT NULL,
+                    album_id TEXT NOT NULL,
+                    PRIMARY KEY (artist_id, position)
+                );
+                CREATE TABLE IF NOT EXISTS artist_names (
+                    name TEXT PRIMARY KEY,
+                    artist_id TEXT NOT NULL,
+                    pinned INTEGER NOT NULL DEFAULT 0,
+                    resolved_at REAL NOT NULL
+                );
+                PRAGMA user_version = {self.SCHEMA_VERSION};
+            """)
+
+    def is_fresh(self, fetched_at):
+        return self.ttl is None or time.time() - fetched_at < self.ttl
+
+    def get_artist(self, artist_id, album_groups=DEFAULT_ALBUM_GROUPS):
+        """
+        Read a cached discography.
+
+        Args:
+            artist_id: Spotify ID of the artist
+            album_groups: The artist_albums groups to read
+
+        Returns:
+            tuple: (artist_name, albums, tracks) as Album and Track records, or
+                   None if the artist is not cached, its entry has expired or
+                   it was crawled without some of the groups
+        """
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                'SELECT name, album_groups, fetched_at FROM artists WHERE artist_id = ?', (artist_id,)
+            ).fetchone()
+            if row is None or not self.is_fresh(row[2]) or not set(album_groups) <= set(row[1].split(',')):
+                return None
+            albums, tracks = self.read_discography(conn, artist_id, album_groups)
+        return row[0], albums, tracks
+
+    def read_discography(self, conn, artist_id, album_groups):
+        albums = [Album(*row) for row in conn.execute(
+            'SELECT album_id, name, release_date, album_group FROM albums WHERE artist_id = ? ORDER BY position',
+            (artist_id,)
+        ) if row[3] in album_groups]
+        albums_by_id = {album.id: album for album in albums}
+        tracks = []
+        for track_id, name, artist_ids, artist_names, album_id in conn.execute(
+            'SELECT track_id, name, artist_ids, artist_names, album_id FROM tracks WHERE artist_id = ? ORDER BY position',
+            (artist_id,)
+        ):
+            album = albums_by_id.get(album_id)
+            if album is None:
+                continue
+            tracks.append(Track(
+                track_id,
+                name,
+                tuple(sys.intern(credited_id) for credited_id in json.loads(artist_ids)),
+                tuple(sys.intern(credited_name) for credited_name in json.loads(artist_names)),
+                album.id,
+                album.name,
+                album.release_date,
+                album.album_group,
+            ))
+        return albums, tracks
+
+    def insert_discography(self, conn, artist_id, albums, tracks, first_position=0):
+        conn.executemany(
+            'INSERT INTO albums (artist_id, position, album_id, name, release_date, album_group) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (artist_id, first_position + i, album.id, album.name, album.release_date, album.album_group)
+                for i, album in enumerate(albums)
+            ]
+        )
+        conn.executemany(
+            """INSERT INTO tracks (artist_id, position, track_id, name, artist_ids, artist_names, album_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (artist_id, first_position + i, track.id, track.name,
+                 json.dumps(track.artist_ids), json.dumps(track.artist_names), track.album_id)
+                for i, track in enumerate(tracks)
+            ]
+        )
+
+    def save_artist(self, artist_id, artist_name, albums, tracks, album_groups=DEFAULT_ALBUM_GROUPS):
+        """Replace the cached discography of an artist with the Album and Track records of album_groups."""
+        with closing(self.connect()) as conn, conn:
+            self.delete_artist_rows(conn, artist_id)
+            conn.execute(
+                'INSERT INTO artists (artist_id, name, album_groups, fetched_at) VALUES (?, ?, ?, ?)',
+                (artist_id, artist_name, ','.join(album_groups), time.time())
+            )
+            self.insert_discography(conn, artist_id, albums, tracks)
+
+    def get_sync_state(self, artist_id):
+        """
+        Read what is known of an artist's discography, even if it has expired.
+
+        Returns:
+            tuple: (artist_name, crawled album groups, set of known album IDs,
+                   newest release date), or None if the artist was never cached
+        """
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute('SELECT name, album_groups FROM artists WHERE artist_id = ?', (artist_id,)).fetchone()
+            if row is None:
+                return None
+            album_ids = {album_id for (album_id,) in conn.execute(
+                'SELECT album_id FROM albums WHERE artist_id = ?', (artist_id,)
+            )}
+            newest_release_date = conn.execute(
+                "SELECT MAX(release_date) FROM albums WHERE artist_id = ? AND release_date NOT IN ('', 'Unknown')",
+                (artist_id,)
+            ).fetchone()[0]
+        return row[0], tuple(row[1].split(',')), album_ids, newest_release_date
+
+    def add_albums(self, artist_id, albums, tracks, album_groups=DEFAULT_ALBUM_GROUPS):
+        """
+        Put newly released albums and their tracks in front of a cached
+        discography and mark it fresh.
+
+        Returns:
+            list: All the cached tracks of album_groups, new ones first
+        """
+        with closing(self.connect()) as conn, conn:
+            conn.execute('UPDATE artists SET fetched_at = ? WHERE artist_id = ?', (time.time(), artist_id))
+            # Albums and tracks are prepended under the same offset, keeping both tables in album order
+            first = conn.execute(
+                'SELECT MIN(COALESCE((SELECT MIN(position) FROM albums WHERE artist_id = ?), 0), '
+                'COALESCE((SELECT MIN(position) FROM tracks WHERE artist_id = ?), 0))',
+                (artist_id, artist_id)
+            ).fetchone()[0]
+            self.insert_discography(conn, artist_id, albums, tracks, first_position=first - max(len(albums), len(tracks)))
+            return self.read_discography(conn, artist_id, album_groups)[1]
+
+    def delete_artist_rows(self, conn, artist_id):
+        for table in ('artists', 'albums', 'tracks'):
+            conn.execute(f'DELETE FROM {table} WHERE artist_id = ?', (artist_id,))
+
+    def invalidate(self, artist_id=None):
+        """Drop one artist from the cache, or every artist if no ID is given."""
+        with closing(self.connect()) as conn, conn:
+            if artist_id is None:
+                for table in ('artists', 'albums', 'tracks'):
+                    conn.execute(f'DELETE FROM {table}')
+            else:
+                self.delete_artist_rows(conn, artist_id)
+
+    def purge_expired(self):
+        """Delete every artist whose entry is older than the TTL."""
+        if self.ttl is None:
+            return
+        with closing(self.connect()) as conn, conn:
+            expired = [artist_id for (artist_id,) in conn.execute(
+                'SELECT artist_id FROM artists WHERE fetched_at < ?', (time.time() - self.ttl,)
+            )]
+            for artist_id in expired:
+                self.delete_artist_rows(conn, artist_id)
+
+    def get_artist_ids(self, names):
+        """
+        Look up resolved artist names in a single query.
+
+        Args:
+            names: List of normalized artist names
+
+        Returns:
+            dict: Normalized name -> artist ID, for the names that are cached
+        """
+        names = list(set(names))
+        resolved = {}
+        with closing(self.connect()) as conn, conn:
+            # Stay well below SQLite's limit on the number of query parameters
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                resolved.update(conn.execute(
+                    f'SELECT name, artist_id FROM artist_names WHERE name IN ({", ".join("?" * len(chunk))})', chunk
+                ).fetchall())
+        return resolved
+
+    def save_artist_id(self, name, artist_id, pinned=False):
+        """
+        Record the artist ID a normalized name resolves to.
+
+        A pinned name keeps its ID until it is pinned again or forgotten, so
+        ambiguous names can be fixed by hand.
+        """
+        with closing(self.connect()) as conn, conn:
+            if pinned:
+                conn.execute(
+                    'INSERT OR REPLACE INTO artist_names (name, artist_id, pinned, resolved_at) VALUES (?, ?, 1, ?)',
+                    (name, artist_id, time.time())
+                )
+            else:
+                conn.execute(
+                    """INSERT INTO artist_names (name, artist_id, pinned, resolved_at) VALUES (?, ?, 0, ?)
+                       ON CONFLICT(name) DO UPDATE SET artist_id = excluded.artist_id, resolved_at = excluded.resolved_at
+                       WHERE NOT artist_names.pinned""",
+                    (name, artist_id, time.time())
+                )
+
+    def forget_artist_name(self, name=None):
+        """Drop one resolved name, or every name (pinned ones included) if none is given."""
+        with closing(self.connect()) as conn, conn:
+            if name is None:
+                conn.execute('DELETE FROM artist_names')
+            else:
+                conn.execute('DELETE FROM artist_names WHERE name = ?', (name,))
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+class LLMCache:
+    """
+    Cache of chat completion answers, keyed by the model and a hash of the messages.
+
+    Answers are kept in a small in-memory LRU in front of a SQLite file, so they
+    survive Streamlit reruns and restarts. Entries older than `ttl` seconds are
+    ignored and purged, and the file keeps at most `max_entries` answers, the
+    least recently used being evicted first.
+    """
+
+    def __init__(self, path='llm_cache.sqlite', ttl=30 * 24 * 3600, max_entries=5000, memory_entries=256):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()  # key -> (content, created_at)
+        self.lock = threading.Lock()
+        self.create_tables()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_tables(self):
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS completions_used_at ON completions (used_at)')
+
+    def key(self, model, messages):
+        payload = json.dumps({'model': model, 'messages': messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_fresh(self, created_at):
+        return self.ttl is None or time.time() - created_at < self.ttl
+
+    def remember(self, key, content, created_at):
+        with self.lock:
+            self.memory[key] = (content, created_at)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached answer for a key, or None if it is missing or expired."""
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached and self.is_fresh(cached[1]):
+                self.memory.move_to_end(key)
+                return cached[0]
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute('SELECT content, created_at FROM completions WHERE key = ?', (key,)).fetchone()
+            if row is None or not self.is_fresh(row[1]):
+                return None
+            conn.execute('UPDATE completions SET used_at = ? WHERE key = ?', (time.time(), key))
+        self.remember(key, row[0], row[1])
+        return row[0]
+
+    def set(self, key, model, content):
+        """Store an answer, then evict expired and least recently used entries."""
+        now = time.time()
+        self.remember(key, content, now)
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO completions (key, model, content, created_at, used_at) VALUES (?, ?, ?, ?, ?)',
+                (key, model, content, now, now)
+            )
+            if self.ttl is not None:
+                conn.execute('DELETE FROM completions WHERE created_at < ?', (now - self.ttl,))
+            conn.execute(
+                'DELETE FROM completions WHERE key IN '
+                '(SELECT key FROM completions ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def invalidate(self, key=None):
+        """Drop one answer, e.g. one that could not be parsed, or every answer if no key is given."""
+        with self.lock:
+            if key is None:
+                self.memory.clear()
+            else:
+                self.memory.pop(key, None)
+        with closing(self.connect()) as conn, conn:
+            if key is None:
+                conn.execute('DELETE FROM completions')
+            else:
+                conn.execute('DELETE FROM completions WHERE key = ?', (key,))
@@ -10,33 +10,91 @@ from PIL import Image, ImageDraw, ImageFont
 import base64
 import random
 import datetime
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from collections import deque
+from Util.PlaylistRegistry import PlaylistRegistry
+from Util.normalization import normalize_name
 
 class MySpotify(spotipy.Spotify):
-    def __init__(self, client_id=None, client_secret=None, redirect_uri=None, scope=None, access_token=None, skip_user_playlists=False):
+    # Statuses spotipy retries itself. 429 is left out so that it reaches with_retry_after
+    # with its Retry-After header, instead of ending as a header-less SpotifyException(429)
+    retried_statuses = (500, 502, 503, 504)
+
+    def __init__(self, client_id=None, client_secret=None, redirect_uri=None, scope=None, access_token=None, skip_user_playlists=False, warm_up=False):
         if access_token:
             # Initialize with user-provided access token
-            super().__init__(auth=access_token)
+            super().__init__(auth=access_token, status_forcelist=self.retried_statuses)
         else:
             # Initialize with client credentials
             self.auth_manager = self.oauth2_manager(client_id, client_secret, redirect_uri, scope)
-            super().__init__(auth_manager=self.auth_manager)
+            super().__init__(auth_manager=self.auth_manager, status_forcelist=self.retried_statuses)
         
-        # Skip loading user playlists if requested (useful for quick searches)
-        if not skip_user_playlists:
+        # The user profile and playlists are only fetched on first access, so creating a client is free.
+        # Skipping user playlists (useful for quick searches) starts with an empty playlist list.
+        self.lazy_lock = threading.RLock()
+        self._profile = None
+        self._user_id = None
+        self._playlists = PlaylistRegistry()
+        self.playlists_loaded = skip_user_playlists
+            
+        self.fish_emoji = '\ud83d\udc1f'.encode('utf-16', 'surrogatepass').decode('utf-16')
+
+        if warm_up:
+            self.warm_up()
+
+    @property
+    def profile(self):
+        """The current user's profile, requested from /me once."""
+        with self.lazy_lock:
+            if self._profile is None:
+                self._profile = self.me()
+            return self._profile
+
+    @property
+    def user_id(self):
+        with self.lazy_lock:
+            if self._user_id is None:
+                self._user_id = self.profile['id'].replace('#', '%23', 1)
+            return self._user_id
+
+    @user_id.setter
+    def user_id(self, user_id):
+        self._user_id = user_id
+
+    @property
+    def playlists(self):
+        """PlaylistRegistry of the user's playlists, loaded on first access."""
+        self.load_user_playlists()
+        return self._playlists
+
+    @property
+    def pl_ids(self):
+        return self.playlists.pl_ids
+
+    @property
+    def pl_names(self):
+        return self.playlists.pl_names
+
+    def load_user_playlists(self):
+        with self.lazy_lock:
+            if self.playlists_loaded:
+                return
             try:
-                self.user_id = self.me()['id'] if '#' not in self.me()['id'] else self.me()['id'].replace('#','%23',1)
-                self.pl_ids, self.pl_names = self.get_user_playlist_names_and_ids()
+                self._playlists = PlaylistRegistry(*self.get_user_playlist_names_and_ids())
             except Exception as e:
                 print(f"Warning: Could not load user playlists: {str(e)}")
-                self.user_id = None
-                self.pl_ids = []
-                self.pl_names = []
-        else:
-            self.user_id = None
-            self.pl_ids = []
-            self.pl_names = []
-            
-        self.fish_emoji = '\ud83d\udc1f'.encode('utf-16', 'surrogatepass').decode('utf-16')
+                self._playlists = PlaylistRegistry()
+            self.playlists_loaded = True
+
+    def warm_up(self):
+        """Load the user profile and playlists in a background thread. Accessors wait for it if needed."""
+        thread = threading.Thread(target=self.load_user_playlists, daemon=True)
+        thread.start()
+        return thread
     
     
     def ars_from_ids(self, ids):
@@ -112,33 +170,25 @@ class MySpotify(spotipy.Spotify):
         return self.emoji_from_surrogates(self.get_surrogates(long_code))
     
     def find_all_pl_ids_containing_foo(self, foo, name = False):
+        pl_ids = self.playlists.containing(foo)
         if name:
-            return [[pl_id, pl_name] for pl_id, pl_name in zip(self.pl_ids, self.pl_names) if foo in pl_name]            
+            return [[pl_id, self.playlists.name(pl_id)] for pl_id in pl_ids]
         else:
-            return [pl_id for pl_id, pl_name in zip(self.pl_ids, self.pl_names) if foo in pl_name]
+            return pl_ids
 
     def find_pl_id(self, pl_names, create_missing = False, create_all = False, public=True):
         if type(pl_names) == str:
-            pl_names = pl_names.split('aaaaaaaaaaaaaaaaaaaaaaa')
+            pl_names = [pl_names]
         pl_names = list(pl_names)
-        pl_ids = [False for i in pl_names]
-        k = 0
-        while k < len(self.pl_ids) and not all(pl_ids):
-            if self.pl_names[k] in pl_names:
-                for j, l in enumerate(pl_names):
-                    if l == self.pl_names[k]:
-                        pl_ids[j] = self.pl_ids[k]
-            k += 1
+        pl_ids = [self.playlists.find(pl_name) for pl_name in pl_names]
         if create_all:
-            for i in [i for i,j in enumerate(pl_ids)]:
+            for i in range(len(pl_names)):
                 pl_ids[i] = self.user_playlist_create(self.user_id, pl_names[i],public=public)["id"]
-                self.pl_names.append(pl_names[i])
-                self.pl_ids.append(pl_ids[i])
+                self.playlists.add(pl_ids[i], pl_names[i])
         elif create_missing:
             for i in [i for i,j in enumerate(pl_ids) if j == False]:
                 pl_ids[i] = self.user_playlist_create(self.user_id, pl_names[i], public=public)["id"]
-                self.pl_names.append(pl_names[i])
-                self.pl_ids.append(pl_ids[i])
+                self.playlists.add(pl_ids[i], pl_names[i])
         ### to return a string if the query was for a single playlist
         if len(pl_ids) == 1:
             pl_ids = pl_ids[0]
@@ -158,12 +208,32 @@ class MySpotify(spotipy.Spotify):
     def get_year(self):
         return str(datetime.date.today().year)[2:]
 
+    def get_all_pages(self, fetch, limit, max_workers=8):
+        """Fetch every item of a paged endpoint as one list, see iter_pages."""
+        return [item for page in self.iter_pages(fetch, limit, max_workers) for item in page]
+
+    def iter_pages(self, fetch, limit, max_workers=8):
+        """
+        Yield the items of a paged endpoint page by page, in endpoint order.
+
+        fetch(limit=..., offset=...) is called once for the first page, whose total
+        gives the remaining offsets. Those pages are fetched concurrently, with at
+        most max_workers of them in flight so memory stays bounded.
+        """
+        first = self.with_retry_after(fetch, limit=limit, offset=0)
+        yield first['items']
+        offsets = iter(range(limit, first['total'], limit))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            submit = lambda offset: executor.submit(self.with_retry_after, fetch, limit=limit, offset=offset)
+            pending = deque(submit(offset) for offset in islice(offsets, max_workers))
+            while pending:
+                page = pending.popleft().result()
+                for offset in islice(offsets, 1):
+                    pending.append(submit(offset))
+                yield page['items']
+
     def get_liked_songs(self):
-        results = self.current_user_saved_tracks()
-        tr = results['items']
-        while results['next']:
-            results = self.next(results)
-            tr.extend(results['items'])
+        tr = self.get_all_pages(self.current_user_saved_tracks, 50)
         tr_ids = [i['track']['id'] for i in tr]
         tr_names = [i['track']['name'] for i in tr]
         return tr_ids, tr_names
@@ -188,14 +258,7 @@ class MySpotify(spotipy.Spotify):
             user_id = self.user_id
         pl_ids = []
         pl_names = []
-        results = self.user_playlists(user_id)
-        playlists = results['items']
-        gab=0
-        k=0
-        while results['next']:
-            k += 1
-            results = self.user_playlists(user_id, offset=k*50) 
-            playlists.extend(results['items'])
+        playlists = self.get_all_pages(partial(self.user_playlists, user_id), 50)
         for i in playlists:
             pl_ids.append(i['id'])
             pl_names.append(i['name'])
@@ -229,45 +292,45 @@ class MySpotify(spotipy.Spotify):
             self.clean_liked_songs(tr_ids)
         
     def normalize_name(self, foo):
-        foo = unidecode.unidecode(foo.lower())
-        to_cut = [' - ', ' (', ' [',' (feat',' (Feat',' (Prod',' (prod',' (with',' (from',' (From',' feat']
-        for i in to_cut : foo = foo.split(i)[0]
-        return foo
+        return normalize_name(foo)
     
     def oauth2_manager(self, client_id, client_secret, redirect_uri, scope):
         oauth = spotipy.oauth2.SpotifyOAuth(client_id, client_secret, redirect_uri, scope=scope)
         return oauth
 
     def order_by_popularity(self, pl_id):
-        pl_tr = self.pl_tr(pl_id)
+        pl_tr = self.pl_tr(pl_id, fields='items(track(id,popularity)),total')
         sorted_ids = [i['track']['id'] for i in sorted(pl_tr, key=lambda item: item['track']['popularity'], reverse=True)]
         self.clean_playlist(pl_id)
         self.pl_add_tr(pl_id, sorted_ids)
 
-    def pl_tr(self, pl_id):
-        results = self.playlist_tracks(pl_id, market = 'FR')
-        pl_tr = results['items']
-        while results['next']:
-            results = self.next(results)
-            pl_tr.extend(results['items'])
-        pl_tr = [i for i in pl_tr if i['track'] != None]
-        pl_tr = [i for i in pl_tr if i['track']['id'] != None]
-        return pl_tr
+    def iter_pl_tr(self, pl_id, fields=None):
+        """
+        Yield the playlist items page by page, skipping local or unavailable tracks.
+
+        fields is Spotify's projection, e.g. 'items(track(id,name)),total'; it must
+        keep total and track.id.
+        """
+        for page in self.iter_pages(partial(self.playlist_tracks, pl_id, fields=fields, market = 'FR'), 100):
+            for i in page:
+                if i['track'] != None and i['track']['id'] != None:
+                    yield i
+
+    def pl_tr(self, pl_id, fields=None):
+        return list(self.iter_pl_tr(pl_id, fields=fields))
 
     def pl_tr_names(self, pl_id):
-        pl_tr = self.pl_tr(pl_id)
-        tr_names = [self.normalize_name(i["track"]["name"]) for i in pl_tr]
-        return tr_names
+        return [self.normalize_name(i["track"]["name"]) for i in self.iter_pl_tr(pl_id, fields='items(track(id,name)),total')]
     
     def pl_tr_ids(self, pl_id):
-        pl_tr = self.pl_tr(pl_id)
-        tr_ids = [i["track"]["id"] for i in pl_tr]
-        return tr_ids
+        return [i["track"]["id"] for i in self.iter_pl_tr(pl_id, fields='items(track(id)),total')]
 
     def pl_tr_names_and_ids(self, pl_id):
-        pl_tr = self.pl_tr(pl_id)
-        tr_names = [self.normalize_name(i["track"]["name"]) for i in pl_tr]
-        tr_ids = [i["track"]["id"] for i in pl_tr]
+        tr_names = []
+        tr_ids = []
+        for i in self.iter_pl_tr(pl_id, fields='items(track(id,name)),total'):
+            tr_names.append(self.normalize_name(i["track"]["name"]))
+            tr_ids.append(i["track"]["id"])
         return tr_names, tr_ids
 
 
@@ -278,6 +341,13 @@ class MySpotify(spotipy.Spotify):
         for j in tr_ids:
             self.playlist_add_items(pl_id, items=j)
     
+    def pl_add_missing_tr(self, pl_id, tr_ids):
+        """Add only the tracks not already in the playlist, in 100-track batches. Returns the added ids."""
+        alr_in_ids = set(self.pl_tr_ids(pl_id))
+        to_add_ids = [tr_id for tr_id in self.clean_dupli(tr_ids) if tr_id not in alr_in_ids]
+        self.pl_add_tr(pl_id, to_add_ids)
+        return to_add_ids
+
     def read_txt_to_array(self, filename):
         with open(filename, 'r') as us:
             lines = us.readlines()
@@ -285,26 +355,37 @@ class MySpotify(spotipy.Spotify):
         return [i.strip('\n') for i in lines]
 
     def unfollow_pl_from_ids(self, pl_ids):
-        if type(pl_ids) in [tuple, list]:
-            for i in pl_ids:
-                if i != False:
-                    self.current_user_unfollow_playlist(i)
-        else:
-            if pl_ids != False:
-                self.current_user_unfollow_playlist(pl_ids)
+        if type(pl_ids) not in [tuple, list]:
+            pl_ids = [pl_ids]
+        for i in pl_ids:
+            if i != False:
+                self.current_user_unfollow_playlist(i)
+                # Keep the registry in sync, unless it has not been loaded yet
+                if self.playlists_loaded:
+                    self._playlists.remove(i)
                 
     def unfollow_pl_from_names(self, pl_names, all_occ = False):
-        pl_ids = self.find_pl_id(pl_names)
-        self.unfollow_pl_from_ids(pl_ids)
         if all_occ == True:
-            if not isinstance(pl_ids,bool):
-                while any(pl_ids):
-                        self.unfollow_pl_from_ids(pl_ids)
-                        pl_ids = self.find_pl_id(pl_names)
-            else:
-                while pl_ids != False:
-                    self.unfollow_pl_from_ids(pl_ids)
-                    pl_ids = self.find_pl_id(pl_names)
+            if type(pl_names) == str:
+                pl_names = [pl_names]
+            self.unfollow_pl_from_ids(self.flatten([self.playlists.find_all(pl_name) for pl_name in pl_names]))
+        else:
+            self.unfollow_pl_from_ids(self.find_pl_id(pl_names))
+
+    def with_retry_after(self, fn, *args, max_retries=5, **kwargs):
+        """
+        Call fn, sleeping for the Retry-After delay each time Spotify answers 429.
+
+        Only real 429 responses are retried: a 429 without headers is spotipy
+        reporting that its own retries of a 5xx error ran out.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except spotipy.exceptions.SpotifyException as e:
+                if e.http_status != 429 or not e.headers or attempt == max_retries:
+                    raise
+                time.sleep(float(e.headers.get('Retry-After', 1)))
 
     def write_pl_ids_to_txt(self, pl_ids, path):
         with open(path, 'w+') as f:
@@ -468,16 +549,33 @@ class MySpotify(spotipy.Spotify):
             pl_id = self.find_pl_id(discov_name, create_missing=True)
             # self.clean_playlist(pl_id)
             self.cover_grid(artists, pl_id)
-            for artist in artists:
-                self.one_discov(artist, pl_id, tr_num)
+            # Read the playlist once, then keep its names up to date in memory for the whole run
+            alr_in_names = set(self.pl_tr_names(pl_id))
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                all_top_tracks = list(executor.map(self.get_top_tracks, artists))
+            to_add_ids = []
+            for top_tracks in all_top_tracks:
+                to_add_ids.extend(self.select_new_tracks(top_tracks, alr_in_names, tr_num))
+            self.pl_add_tr(pl_id, to_add_ids)
             
     def discov_name(self, pl_name):
         return self.emoji_from_long_code(0x1F31C) + ' ' + pl_name + ' ' + self.emoji_from_long_code(0x1F31B)
 
-    def one_discov(self, artist, pl_id, tr_num):
-        top_tracks = self.artist_top_tracks(artist['id'], country='US')['tracks']
-        tr_ids = [i['id'] for i in top_tracks][:tr_num]
-        tr_names = [i['name'] for i in top_tracks][:tr_num]
-        alr_in_names = self.pl_tr_names(pl_id)
-        to_add_ids = [i for i,j in zip(tr_ids,tr_names) if self.normalize_name(j) not in alr_in_names]
-        self.pl_add_tr(pl_id, to_add_ids)
\ No newline at end of file
+    def get_top_tracks(self, artist):
+        return self.with_retry_after(self.artist_top_tracks, artist['id'], country='US')['tracks']
+
+    def one_discov(self, artist, pl_id, tr_num, alr_in_names=None):
+        if alr_in_names is None:
+            alr_in_names = set(self.pl_tr_names(pl_id))
+        to_add_ids = self.select_new_tracks(self.get_top_tracks(artist), alr_in_names, tr_num)
+        self.pl_add_tr(pl_id, to_add_ids)
+
+    def select_new_tracks(self, top_tracks, alr_in_names, tr_num):
+        """Pick the first tr_num tracks whose normalized name is not in alr_in_names, and record them there."""
+        to_add_ids = []
+        for track in top_tracks[:tr_num]:
+            name = self.normalize_name(track['name'])
+            if name not in alr_in_names:
+                to_add_ids.append(track['id'])
+                alr_in_names.add(name)
+        return to_add_ids
@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+
+class PlaylistRegistry:
+    """
+    Index of the user's playlists.
+
+    Playlists keep their original order, and are indexed by a name -> ids
+    multimap, an id -> name map and a trigram index used for substring
+    lookups. The indexes are updated in place when playlists are added or
+    removed, so every lookup avoids scanning the whole library.
+    """
+
+    def __init__(self, pl_ids=(), pl_names=()):
+        self.names_by_id = {}
+        self.positions = {}
+        self.next_position = 0
+        self.ids_by_name = defaultdict(list)
+        self.ids_by_trigram = defaultdict(set)
+        self.substring_cache = {}
+        for pl_id, pl_name in zip(pl_ids, pl_names):
+            self.add(pl_id, pl_name)
+
+    def __len__(self):
+        return len(self.names_by_id)
+
+    def __contains__(self, pl_id):
+        return pl_id in self.names_by_id
+
+    @property
+    def pl_ids(self):
+        return list(self.names_by_id)
+
+    @property
+    def pl_names(self):
+        return list(self.names_by_id.values())
+
+    def trigrams(self, foo):
+        return {foo[i:i + 3] for i in range(len(foo) - 2)}
+
+    def add(self, pl_id, pl_name):
+        if pl_id in self.names_by_id:
+            self.remove(pl_id)
+        self.names_by_id[pl_id] = pl_name
+        self.positions[pl_id] = self.next_position
+        self.next_position += 1
+        self.ids_by_name[pl_name].append(pl_id)
+        for trigram in self.trigrams(pl_name):
+            self.ids_by_trigram[trigram].add(pl_id)
+        self.substring_cache.clear()
+
+    def remove(self, pl_id):
+        pl_name = self.names_by_id.pop(pl_id, None)
+        if pl_name is None:
+            return
+        del self.positions[pl_id]
+        self.ids_by_name[pl_name].remove(pl_id)
+        if not self.ids_by_name[pl_name]:
+            del self.ids_by_name[pl_name]
+        for trigram in self.trigrams(pl_name):
+            self.ids_by_trigram[trigram].discard(pl_id)
+            if not self.ids_by_trigram[trigram]:
+                del self.ids_by_trigram[trigram]
+        self.substring_cache.clear()
+
+    def name(self, pl_id):
+        return self.names_by_id.get(pl_id)
+
+    def find(self, pl_name):
+        """Return the id of the first playlist called pl_name, or False."""
+        ids = self.ids_by_name.get(pl_name)
+        return ids[0] if ids else False
+
+    def find_all(self, pl_name):
+        """Return the ids of every playlist called pl_name."""
+        return list(self.ids_by_name.get(pl_name, []))
+
+    def containing(self, foo):
+        """Return the ids of every playlist whose name contains foo, in library order."""
+        if foo not in self.substring_cache:
+            trigrams = self.trigrams(foo)
+            if trigrams:
+                # Only names sharing every trigram of foo can contain it
+                candidates = set.intersection(*[self.ids_by_trigram.get(trigram, set()) for trigram in trigrams])
+            else:
+                candidates = self.names_by_id
+            matches = [pl_id for pl_id in candidates if foo in self.names_by_id[pl_id]]
+            self.substring_cache[foo] = sorted(matches, key=self.positions.__getitem__)
+        return list(self.substring_cache[foo])
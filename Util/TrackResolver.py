@@ -0,0 +1,157 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from Util.matching import rank_candidates
+
+# The search results of a song, and the index of its best one (-1 if none matched, None if it is still ambiguous)
+Resolution = namedtuple('Resolution', ['tracks', 'best_index'])
+
+
+class TrackResolver:
+    """
+    Resolve song lines to Spotify tracks in the background, ahead of the moment they are needed.
+
+    Songs are submitted as soon as they are known (while the LLM is still
+    streaming the playlist, or after a refinement) and searched on a bounded
+    thread pool. Searched songs are collected in batches, and each batch is
+    ranked in a single rank_candidates call on a second pool, which also hands
+    the songs the ranking leaves ambiguous to the match function (the LLM). A
+    batch is sent once it is full, or once the list was declared complete with
+    flush() and no search is left running.
+
+    Asking for the resolutions later only waits for the work started earlier,
+    and does what is missing for songs that were never submitted. Songs
+    removed from the playlist are cancelled, along with their pending ranking.
+    """
+
+    def __init__(self, spotify_client, query=lambda song: song, match=None, batch_size=10, max_workers=8, max_match_workers=4, **search_kwargs):
+        """
+        Args:
+            spotify_client: MySpotify client running the searches
+            query: Function turning a song line into a search query
+            match: Function picking the best track of each (song, tracks) entry it is
+                   given, as a list of indices (-1 if none matched); ambiguous songs
+                   are left unresolved without it
+            batch_size: Number of searched songs ranked and matched together
+            max_workers: Maximum number of searches running at the same time
+            max_match_workers: Maximum number of batches ranked and matched at the same time
+            search_kwargs: Extra arguments of every search (type, market, limit...)
+        """
+        self.spo = spotify_client
+        self.query = query
+        self.match = match
+        self.batch_size = batch_size
+        self.search_kwargs = search_kwargs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.match_executor = ThreadPoolExecutor(max_workers=max_match_workers)
+        self.futures = {}  # song -> future of its search results
+        self.rankings = {}  # song -> future of its batch's {song: best index}
+        self.batch = []  # (song, tracks) searched and waiting to be ranked
+        self.searching = 0  # Searches submitted and not finished yet
+        self.complete = False  # Whether flush() was called since the last new song
+        self.lock = threading.RLock()
+
+    def search(self, song):
+        try:
+            result = self.spo.with_retry_after(self.spo.search, self.query(song), **self.search_kwargs)
+            tracks = result['tracks']['items']
+        finally:
+            with self.lock:
+                self.searching -= 1
+        with self.lock:
+            if tracks and song in self.futures:
+                self.batch.append((song, tracks))
+            if len(self.batch) >= self.batch_size or (self.complete and not self.searching):
+                self.send_batch()
+        return tracks
+
+    def submit(self, song):
+        """
+        Start searching a song unless it is already being searched. Returns its future.
+
+        A search that failed (e.g. a Spotify timeout) or was cancelled is
+        started again, so one transient error is not kept for the whole session.
+        """
+        with self.lock:
+            future = self.futures.get(song)
+            if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+                self.searching += 1
+                self.complete = False
+                self.futures[song] = self.executor.submit(self.search, song)
+            return self.futures[song]
+
+    def flush(self):
+        """Declare the submitted songs complete: the last partial batch is sent as soon as no search is running."""
+        with self.lock:
+            self.complete = True
+            if not self.searching:
+                self.send_batch()
+
+    def send_batch(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+            if batch:
+                future = self.match_executor.submit(self.rank, batch)
+                for song, _ in batch:
+                    self.rankings[song] = future
+
+    def rank(self, batch):
+        """Rank a batch of (song, tracks) in one call and match its ambiguous songs. Returns {song: best index}."""
+        songs = [song for song, _ in batch]
+        best_indices = dict(zip(songs, rank_candidates(songs, [tracks for _, tracks in batch])))
+        ambiguous = [(song, tracks) for song, tracks in batch if best_indices[song] is None]
+        print(f"Matched {len(batch) - len(ambiguous)} songs locally, {len(ambiguous)} left for the LLM")
+        if ambiguous and self.match:
+            for (song, _), best_index in zip(ambiguous, self.match(ambiguous)):
+                best_indices[song] = best_index
+        return best_indices
+
+    def cancel(self, song):
+        """Forget a song, cancelling its search, and its ranking if no other song waits for it."""
+        with self.lock:
+            future = self.futures.pop(song, None)
+            if future and future.cancel():
+                self.searching -= 1
+            self.batch = [(batch_song, tracks) for batch_song, tracks in self.batch if batch_song != song]
+            ranking = self.rankings.pop(song, None)
+            if ranking and ranking not in self.rankings.values():
+                ranking.cancel()
+
+    def keep_only(self, songs):
+        """Cancel every submitted song that is not in songs, e.g. after the playlist was refined."""
+        songs = set(songs)
+        with self.lock:
+            dropped = [song for song in self.futures if song not in songs]
+        for song in dropped:
+            self.cancel(song)
+
+    def results(self, songs):
+        """
+        Return the Resolution of every song, in order.
+
+        Waits for the searches still running and retries the failed ones, sends
+        the last partial batch, then waits for the rankings. Songs whose ranking
+        is missing or failed are ranked and matched together here.
+        """
+        futures = [self.submit(song) for song in songs]
+        tracks = [future.result() for future in futures]
+        self.flush()
+        best_indices = {}
+        unranked = []
+        for song, candidates in zip(songs, tracks):
+            if not candidates or song in best_indices:
+                continue
+            with self.lock:
+                ranking = self.rankings.get(song)
+            if ranking is not None and not ranking.cancelled() and ranking.exception() is None:
+                best_indices.update(ranking.result())
+            else:
+                unranked.append((song, candidates))
+        if unranked:
+            best_indices.update(self.rank(list(dict(unranked).items())))
+        return [Resolution(candidates, best_indices.get(song)) for song, candidates in zip(songs, tracks)]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.match_executor.shutdown(wait=False)
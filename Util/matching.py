@@ -0,0 +1,150 @@
+"""
+Local, deterministic ranking of Spotify search results against song queries.
+
+Queries and candidates are reduced to sets of normalized artist/title tokens,
+and every query is scored against its candidates at once with numpy. Only
+clear winners are accepted; the other queries are left for the LLM.
+"""
+import re
+
+import numpy as np
+import unidecode
+
+from Util.normalization import is_remix
+
+TOKEN = re.compile(r'[a-z0-9]+')
+# Words that only announce a featuring and carry no identity
+IGNORED_TOKENS = {'feat', 'ft', 'featuring', 'with', 'x', 'and', 'the'}
+VERSION_TOKENS = {'remix', 'mix', 'edit', 'version', 'extended', 'instrumental', 'live', 'acoustic', 'remastered', 'remaster'}
+# Reissue noise ('Remastered 2011', '2019 Remaster') that does not make a different song
+REMASTER_TOKENS = {'remastered', 'remaster'}
+YEAR = re.compile(r'(?:19|20)\d\d')
+
+EXAMPLES = [
+    # (query, candidate 'Artist - Title' pairs, expected best index or None when ambiguous)
+    ("Massive Attack Teardrop", [("Massive Attack", "Teardrop - Remastered 2019")], 0),
+    ("Queen Bohemian Rhapsody", [("Queen", "Bohemian Rhapsody - Remastered 2011"), ("Queen", "Bohemian Rhapsody - Live Aid")], 0),
+    ("Queen Bohemian Rhapsody Remastered 2011", [("Queen", "Bohemian Rhapsody - Remastered 2011"), ("Queen", "Bohemian Rhapsody")], 0),
+    ("Smashing Pumpkins 1979", [("The Smashing Pumpkins", "Tonight, Tonight"), ("The Smashing Pumpkins", "1979 - Remastered 2012")], 1),
+    ("Lorde Royals Tiesto Remix", [("Lorde", "Royals"), ("Lorde", "Royals - Tiesto Remix")], 1),
+    ("Daft Punk One More Time", [("Daft Punk", "Something About Us"), ("Daft Punk", "Digital Love")], None),
+]
+
+
+def tokenize(text):
+    """Return the set of normalized tokens of a query or a track description."""
+    return {token for token in TOKEN.findall(unidecode.unidecode(text.lower())) if token not in IGNORED_TOKENS}
+
+
+def track_tokens(track):
+    return tokenize(' '.join([artist['name'] for artist in track['artists']] + [track['name']]))
+
+
+def drop_reissue_noise(tokens, query_tokens):
+    """Drop the remaster words and bare years of a candidate's tokens, unless the query has some too."""
+    if not query_tokens & REMASTER_TOKENS:
+        tokens = tokens - REMASTER_TOKENS
+    if not any(YEAR.fullmatch(token) for token in query_tokens):
+        tokens = {token for token in tokens if not YEAR.fullmatch(token)}
+    return tokens
+
+
+def score_candidates(queries, candidates):
+    """
+    Score every candidate track against its query.
+
+    The score is the Dice coefficient between the query and candidate token
+    sets, halved for remixes and other versions the query did not ask for.
+    Remaster words and years the query does not mention are left out of the
+    candidate tokens, so a 'Remastered 2011' reissue scores as the song itself.
+
+    Args:
+        queries: List of query strings
+        candidates: List of candidate track lists, one per query
+
+    Returns:
+        numpy.ndarray: (len(queries), max candidates) scores, -1 where a query has fewer candidates
+    """
+    query_tokens = [tokenize(query) for query in queries]
+    candidate_tokens = [
+        [drop_reissue_noise(track_tokens(track), tokens) for track in tracks]
+        for tokens, tracks in zip(query_tokens, candidates)
+    ]
+    width = max([len(tracks) for tracks in candidates], default=0)
+
+    vocabulary = {}
+    for tokens in query_tokens + [tokens for row in candidate_tokens for tokens in row]:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    query_matrix = np.zeros((len(queries), len(vocabulary)), dtype=bool)
+    candidate_matrix = np.zeros((len(queries), width, len(vocabulary)), dtype=bool)
+    present = np.zeros((len(queries), width), dtype=bool)
+    unwanted_version = np.zeros((len(queries), width), dtype=bool)
+    for i, tokens in enumerate(query_tokens):
+        query_matrix[i, [vocabulary[token] for token in tokens]] = True
+        wants_version = bool(tokens & VERSION_TOKENS)
+        for j, (track, tokens) in enumerate(zip(candidates[i], candidate_tokens[i])):
+            candidate_matrix[i, j, [vocabulary[token] for token in tokens]] = True
+            present[i, j] = True
+            unwanted_version[i, j] = not wants_version and is_remix(track['name'], track.get('album', {}).get('name', ''))
+
+    overlap = (candidate_matrix & query_matrix[:, None, :]).sum(axis=2)
+    sizes = query_matrix.sum(axis=1)[:, None] + candidate_matrix.sum(axis=2)
+    scores = np.where(sizes > 0, 2.0 * overlap / np.maximum(sizes, 1), 0.0)
+    scores = np.where(unwanted_version, scores / 2, scores)
+    return np.where(present, scores, -1.0)
+
+
+def rank_candidates(queries, candidates, accept_score=0.8, min_margin=0.15):
+    """
+    Pick the best candidate of each query when the choice is clear.
+
+    A candidate is accepted when it has exactly the query's tokens, or when its
+    score reaches accept_score and beats every other candidate by min_margin.
+    Candidates with the same tokens (the same song released on an album and a
+    single) do not count as competitors.
+
+    Args:
+        queries: List of query strings
+        candidates: List of candidate track lists, one per query
+        accept_score: Minimum score of an accepted candidate
+        min_margin: Minimum lead over the best different candidate
+
+    Returns:
+        list: The index of the chosen candidate for each query, or None when
+              the query is ambiguous and should be decided by the LLM
+    """
+    if not queries:
+        return []
+    scores = score_candidates(queries, candidates)
+    best_indices = []
+    for i, row in enumerate(scores):
+        best = int(np.argmax(row))
+        if row[best] >= 1.0:
+            best_indices.append(best)
+            continue
+        if row[best] < accept_score:
+            best_indices.append(None)
+            continue
+        best_tokens = track_tokens(candidates[i][best])
+        competitors = [
+            score for j, score in enumerate(row)
+            if j != best and score >= 0 and track_tokens(candidates[i][j]) != best_tokens
+        ]
+        if competitors and row[best] - max(competitors) < min_margin:
+            best_indices.append(None)
+        else:
+            best_indices.append(best)
+    return best_indices
+
+
+if __name__ == "__main__":
+    queries = [query for query, _, _ in EXAMPLES]
+    candidates = [[{'name': name, 'artists': [{'name': artist}]} for artist, name in pairs] for _, pairs, _ in EXAMPLES]
+    ranked = rank_candidates(queries, candidates)
+    failures = [(query, expected, got) for (query, _, expected), got in zip(EXAMPLES, ranked) if got != expected]
+    for query, expected, got in failures:
+        print(f"{query!r}: expected {expected!r}, got {got!r}")
+    print(f"{len(EXAMPLES) - len(failures)}/{len(EXAMPLES)} examples ranked as expected")
+    raise SystemExit(1 if failures else 0)
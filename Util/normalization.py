@@ -0,0 +1,103 @@
+"""
+Track title normalization shared by MySpotify, FeaturingsFinder and the app.
+
+Every helper reads titles through parse_title, which scans a raw title once with
+precompiled patterns and memoizes the result, so the dedupe and matching loops
+that see the same titles over and over only pay for each distinct title once.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import unidecode
+
+# A title is cut at the earliest of these markers
+NAME_CUT = re.compile(r' - | \(| \[| feat')
+BASE_NAME_CUT = re.compile(r' - | \(| \[| feat| ft\.| with')
+# Start of the suffix holding remix / version information
+SUFFIX_START = re.compile(r'[-(\[]')
+REMIX_KEYWORDS = re.compile(r'remix|mix|edit|version|extended|instrumental', re.IGNORECASE)
+
+TitleParts = namedtuple('TitleParts', ['base_name', 'suffix', 'has_remix_keyword'])
+
+
+@lru_cache(maxsize=65536)
+def parse_title(track_name):
+    """
+    Split a raw track title into the parts the normalization helpers need.
+
+    Args:
+        track_name: The full track name
+
+    Returns:
+        TitleParts: base_name (see get_base_track_name), suffix (the lowercased
+        text after the first '-', '(' or '[', or None) and has_remix_keyword
+        (whether a remix/mix/edit/version/extended/instrumental keyword follows
+        that first delimiter)
+    """
+    cut = BASE_NAME_CUT.search(track_name)
+    base_name = (track_name[:cut.start()] if cut else track_name).lower().strip()
+    delimiter = SUFFIX_START.search(track_name)
+    if delimiter is None:
+        return TitleParts(base_name, None, False)
+    suffix = track_name[delimiter.end():]
+    return TitleParts(base_name, suffix.lower(), REMIX_KEYWORDS.search(suffix) is not None)
+
+
+@lru_cache(maxsize=65536)
+def normalize_name(foo):
+    """Lowercase, transliterate and cut a title before any ' - ', ' (', ' [' or ' feat' marker."""
+    foo = unidecode.unidecode(foo.lower())
+    cut = NAME_CUT.search(foo)
+    return foo[:cut.start()] if cut else foo
+
+
+@lru_cache(maxsize=4096)
+def normalize_artist_name(artist_name):
+    """Lowercase and transliterate an artist name, the key used to cache its resolution."""
+    return unidecode.unidecode(artist_name.lower()).strip()
+
+
+def get_base_track_name(track_name):
+    """
+    Get the base name of a track by removing any remix or feature information.
+
+    Args:
+        track_name: The full track name
+
+    Returns:
+        str: The base track name
+    """
+    return parse_title(track_name).base_name
+
+
+def is_remix(track_name, album_name):
+    """
+    Determine if a track is a remix based on its name or album name.
+
+    Args:
+        track_name: The name of the track
+        album_name: The name of the album
+
+    Returns:
+        bool: True if the track is identified as a remix, False otherwise
+    """
+    return parse_title(track_name).has_remix_keyword or 'remix' in album_name.lower()
+
+
+def should_keep_remix(track_name, artist1_name, artist2_name):
+    """
+    Determine if a remix should be kept based on whether it's remixed by one of our artists.
+
+    Args:
+        track_name: The name of the track
+        artist1_name: First artist name
+        artist2_name: Second artist name
+
+    Returns:
+        bool: True if the remix should be kept, False otherwise
+    """
+    suffix = parse_title(track_name).suffix
+    if suffix is None:
+        return False
+    return artist1_name.lower() in suffix or artist2_name.lower() in suffix
@@ -0,0 +1,111 @@
+"""
+Local formatting of 'Artist - Song' lines into Spotify search queries.
+
+Implements the rules of the app's format_songs_list prompt without the LLM
+round-trip: featuring markers are dropped but the featured artists are kept
+after the main ones, a remix keeps its remixer at the end, and separators are
+replaced by single spaces. Lines that do not look like 'Artist - Song' are
+rejected so the caller can fall back to the LLM.
+
+Run `python -m Util.song_queries` to check the formatter against EXAMPLES.
+"""
+import re
+
+# Numbering the LLM sometimes adds despite being told not to ("1. ", "2) ")
+NUMBERING = re.compile(r'^\s*\d+\s*[.)]\s*')
+# Between the artists and the song: ' --- ' from generate_playlist, ' - ' from refine_playlist
+ARTIST_SEPARATOR = re.compile(r'\s+(?:-{1,3}|–|—)\s+')
+FEATURING = r'(?:feat\.?|ft\.?|featuring)'
+# Words joining several artists, dropped from the query. An 'x' only joins two artists with
+# a name on each side, so that 'Malcolm X', 'X Ambassadors' or 'Lil Nas X feat. ...' are kept whole
+ARTIST_JOINERS = re.compile(rf'\s*(?:,|&|\+|(?<=\w\s)x(?=\s+(?!(?:{FEATURING}|with|vs\.?)(?:\s|$))\w)|\bvs\.?|\bwith\b|\b{FEATURING}(?=\s|$))\s*', re.IGNORECASE)
+# "(feat. X)", "[with X]" or a trailing "ft. X" in a song title
+FEATURED_GROUP = re.compile(rf'\s*[(\[]\s*(?:{FEATURING}|with)\s+([^)\]]*)[)\]]', re.IGNORECASE)
+FEATURED_TAIL = re.compile(rf'\s+{FEATURING}\s+(.*)$', re.IGNORECASE)
+# "(X Remix)", "[Remix]" or a trailing "- X Remix"
+REMIX_GROUP = re.compile(r'\s*[(\[]([^)\]]*\bremix)[)\]]', re.IGNORECASE)
+REMIX_TAIL = re.compile(r'\s+-\s+(.*\bremix)\s*$', re.IGNORECASE)
+
+EXAMPLES = [
+    # The examples of the format_songs_list prompt
+    ("Artist1 feat. Artist2 - Song Name (Remix)", "Artist1 Artist2 Song Name"),
+    ("Artist3 & Artist4 - Another Song ft. Artist5", "Artist3 Artist4 Artist5 Another Song"),
+    # The formats generate_playlist and refine_playlist ask for
+    ("Daft Punk --- One More Time", "Daft Punk One More Time"),
+    ("Calvin Harris - Summer", "Calvin Harris Summer"),
+    ("1. Massive Attack --- Teardrop", "Massive Attack Teardrop"),
+    ("Drake --- Work (feat. Rihanna)", "Drake Rihanna Work"),
+    ("Rihanna - Work [with Drake]", "Rihanna Drake Work"),
+    ("Bonobo, Totally Enormous Extinct Dinosaurs --- No Reason", "Bonobo Totally Enormous Extinct Dinosaurs No Reason"),
+    ("Disclosure - Latch (feat. Sam Smith & Jessie Ware)", "Disclosure Sam Smith Jessie Ware Latch"),
+    ("Lorde --- Royals (Tiesto Remix)", "Lorde Royals Tiesto Remix"),
+    ("Odesza --- Say My Name - RAC Remix", "Odesza Say My Name RAC Remix"),
+    ("Kanye West featuring Jay-Z --- Otis", "Kanye West Jay-Z Otis"),
+    ("Simon & Garfunkel --- The Sound of Silence", "Simon Garfunkel The Sound of Silence"),
+    ("Florence and the Machine --- Dog Days Are Over", "Florence and the Machine Dog Days Are Over"),
+    ("The Rolling Stones --- (I Can't Get No) Satisfaction", "The Rolling Stones (I Can't Get No) Satisfaction"),
+    ("Skrillex x Diplo --- Where Are U Now", "Skrillex Diplo Where Are U Now"),
+    ("Malcolm X --- Speech", "Malcolm X Speech"),
+    ("X Ambassadors --- Renegades", "X Ambassadors Renegades"),
+    ("Lil Nas X feat. Billy Ray Cyrus --- Old Town Road", "Lil Nas X Billy Ray Cyrus Old Town Road"),
+    ("Malcolm X with Alex Haley --- Interview", "Malcolm X Alex Haley Interview"),
+    ("Artist - Song - Remastered 2011", "Artist Song Remastered 2011"),
+    # Not 'Artist - Song' lines: left to the LLM
+    ("Water", None),
+    ("Artist --- ", None),
+]
+
+
+def split_artists(text):
+    return [artist for artist in ARTIST_JOINERS.split(text) if artist]
+
+
+def format_song_query(line):
+    """
+    Format an 'Artist - Song' line into a search query.
+
+    Args:
+        line: Song line, e.g. 'Artist1 feat. Artist2 - Song Name (Remix)'
+
+    Returns:
+        str: The query, e.g. 'Artist1 Artist2 Song Name', or None if the line
+             does not have an artist and a song around a separator
+    """
+    parts = ARTIST_SEPARATOR.split(NUMBERING.sub('', line).strip(), maxsplit=1)
+    if len(parts) != 2 or not parts[0].strip() or not parts[1].strip():
+        return None
+    artists, title = parts
+
+    featured = []
+    for match in FEATURED_GROUP.finditer(title):
+        featured.extend(split_artists(match.group(1)))
+    title = FEATURED_GROUP.sub('', title)
+
+    # A remix keeps its remixer at the end; a bare "Remix" marker is dropped
+    remix = None
+    match = REMIX_GROUP.search(title) or REMIX_TAIL.search(title)
+    if match:
+        if match.group(1).strip().lower() != 'remix':
+            remix = match.group(1)
+        title = title[:match.start()] + title[match.end():]
+
+    match = FEATURED_TAIL.search(title)
+    if match:
+        featured.extend(split_artists(match.group(1)))
+        title = title[:match.start()]
+
+    # Separators left in the title, e.g. 'Song - Remastered 2011'
+    title = ARTIST_SEPARATOR.sub(' ', title)
+
+    words = split_artists(artists) + featured + [title] + ([remix] if remix else [])
+    query = ' '.join(' '.join(words).replace('---', ' ').split())
+    return query or None
+
+
+if __name__ == "__main__":
+    failures = [(line, expected, format_song_query(line)) for line, expected in EXAMPLES
+                if format_song_query(line) != expected]
+    for line, expected, got in failures:
+        print(f"{line!r}: expected {expected!r}, got {got!r}")
+    print(f"{len(EXAMPLES) - len(failures)}/{len(EXAMPLES)} examples formatted as expected")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,50 @@
+"""
+Compact records of the albums and tracks crawled by FeaturingsFinder.
+
+Spotify's album and track JSON carries markets, images, URLs and more that the
+finder never reads. Records keep only the fields it uses, as tuples, and intern
+the artist names and IDs repeated across a catalog, so the raw JSON can be
+dropped right after parsing.
+"""
+import sys
+from collections import namedtuple
+
+# The artist_albums groups crawled for an artist's own discography
+DEFAULT_ALBUM_GROUPS = ('album', 'single')
+
+Album = namedtuple('Album', ['id', 'name', 'release_date', 'album_group'])
+Track = namedtuple('Track', ['id', 'name', 'artist_ids', 'artist_names', 'album_id', 'album_name', 'release_date', 'album_group'])
+
+
+def album_record(album):
+    """
+    Build an Album from a simplified or full album object.
+
+    album_group (album, single, appears_on...) is only set on artist_albums
+    listings; other album objects fall back to their album_type.
+    """
+    album_group = album.get('album_group') or album.get('album_type') or 'album'
+    return Album(album['id'], album['name'], album.get('release_date', 'Unknown'), sys.intern(album_group))
+
+
+def track_record(track, album):
+    """
+    Build a Track from a simplified track object and the Album it was listed on.
+
+    Args:
+        track: Track object from an album's track listing
+        album: Album record of that album
+
+    Returns:
+        Track: The track, with interned artist IDs and names
+    """
+    return Track(
+        track['id'],
+        track['name'],
+        tuple(sys.intern(artist['id'] or '') for artist in track['artists']),
+        tuple(sys.intern(artist['name']) for artist in track['artists']),
+        album.id,
+        album.name,
+        album.release_date,
+        album.album_group,
+    )
@@ -8,10 +8,12 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 from Util.MySpotify import MySpotify
+from Util.LLMCache import LLMCache
+from Util.TrackResolver import TrackResolver
+from Util.song_queries import format_song_query
 import requests
 import json
-import threading
-from streamlit.runtime.scriptrunner import add_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,9 +22,24 @@ SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 SPOTIFY_REDIRECT_URI = os.getenv('SPOTIFY_REDIRECT_URI')
 SPOTIFY_SCOPE = os.getenv('SPOTIFY_SCOPE')
-
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Maximum number of Spotify searches running at the same time
+SPOTIFY_SEARCH_CONCURRENCY = int(os.getenv('SPOTIFY_SEARCH_CONCURRENCY', 8))
+# Whether song lines the local formatter rejects are formatted by the LLM
+LLM_FORMAT_FALLBACK = os.getenv('LLM_FORMAT_FALLBACK', 'true').lower() != 'false'
+# Ambiguous matches are sent to the LLM in chunks of this many queries, several chunks at a time
+LLM_MATCH_CHUNK_SIZE = int(os.getenv('LLM_MATCH_CHUNK_SIZE', 10))
+LLM_MATCH_CONCURRENCY = int(os.getenv('LLM_MATCH_CONCURRENCY', 4))
+LLM_MATCH_RETRIES = int(os.getenv('LLM_MATCH_RETRIES', 2))
+
+# Initialize OpenAI client (OPENAI_BASE_URL points it to any compatible endpoint, e.g. a local stub)
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), base_url=os.getenv('OPENAI_BASE_URL'))
+
+# Answers to identical prompts are reused across reruns and restarts
+llm_cache = LLMCache(
+    path=os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite'),
+    ttl=float(os.getenv('LLM_CACHE_TTL', 30 * 24 * 3600)),
+    max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+)
 
 # Display the logo
 st.image("static/logo.jpg", width=200)  # Adjust the width as needed
@@ -45,7 +62,92 @@ def exchange_code_for_token(code):
     return response.json()
 
 
-def generate_playlist(description, num_tracks=20):
+def chat_completion(model, messages, use_cache=True):
+    """
+    Return the answer of the model to the messages.
+
+    With use_cache, an identical earlier prompt is answered from the LLM cache.
+    Without it, the model is always called (for creative requests the user
+    wants a new answer to) and its answer replaces the cached one.
+    """
+    key = llm_cache.key(model, messages)
+    if use_cache:
+        content = llm_cache.get(key)
+        if content is not None:
+            print(f"LLM cache hit for {model}")
+            return content
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages
+    )
+    content = response.choices[0].message.content
+    if content is not None:
+        llm_cache.set(key, model, content)
+    return content
+
+def stream_completion(model, messages, use_cache=True):
+    """
+    Yield the answer of the model to the messages as it is generated.
+
+    Same caching as chat_completion: a cached answer is yielded in one piece,
+    and a streamed answer is cached once it is complete.
+    """
+    key = llm_cache.key(model, messages)
+    if use_cache:
+        content = llm_cache.get(key)
+        if content is not None:
+            print(f"LLM cache hit for {model}")
+            yield content
+            return
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True
+    )
+    parts = []
+    for chunk in response:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield delta
+    llm_cache.set(key, model, ''.join(parts))
+
+def iter_lines(chunks):
+    """Yield the non-empty, stripped lines of a stream of text chunks as soon as each line is complete."""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
+def search_query(song):
+    """
+    Turn a song line into a Spotify search query.
+
+    Lines are formatted locally with the rules of format_songs_list; only the
+    lines the formatter rejects are sent to the LLM, if LLM_FORMAT_FALLBACK is on.
+    """
+    query = format_song_query(song)
+    if query is None and LLM_FORMAT_FALLBACK:
+        print(f"Formatting with the LLM: {song}")
+        formatted = [line.strip() for line in format_songs_list([song]) if line.strip()]
+        query = formatted[0] if len(formatted) == 1 else None
+    return query or song
+
+def generate_playlist(description, num_tracks=20, use_cache=False, on_song=None):
+    """
+    Ask the LLM for a playlist title and songs, streaming its answer.
+
+    on_song is called with each song line as soon as it is complete, while the
+    rest of the playlist is still being generated. The answer is only read from
+    the LLM cache with use_cache, so asking again gives new suggestions.
+    """
     prompt = f"Create a playlist of {num_tracks} songs based on this description: '{description}'. The first word returned should be a single word title for the playlist, starting with a capital letter. Then, give the song names and artists, one per line, without numbering or any other text. It is important that there is no numbering before each song. Format each song as 'Artist --- Song'"
     
     messages = [
@@ -53,19 +155,18 @@ def generate_playlist(description, num_tracks=20):
         {"role": "user", "content": prompt}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=messages
-    )
-
-    # Split the content into lines and filter out empty lines
-    lines = [line.strip() for line in response.choices[0].message.content.strip().split('\n') if line.strip()]
-    title = lines[0]  # The first line is the title
-    songs = lines[1:]  # The rest are the songs
+    # Read the non-empty lines as they are streamed
+    lines = iter_lines(stream_completion("gpt-4", messages, use_cache=use_cache))
+    title = next(lines, '')  # The first line is the title
+    songs = []  # The rest are the songs
+    for song in lines:
+        songs.append(song)
+        if on_song:
+            on_song(song)
 
     return title, songs
 
-def refine_playlist(description, current_playlist, refinement, removed_tracks):
+def refine_playlist(description, current_playlist, refinement, removed_tracks, use_cache=False):
     prompt = f"Based on the original description: '{description}', and the refinement request: '{refinement}', modify the following playlist:\n\n{current_playlist}\n\nAvoid re-adding these removed tracks:\n\n{removed_tracks}\n\nProvide an updated list of songs, one per line, without numbering or any other text. It is important that there is no numbering before each song. Format each song as 'Artist - Song'"
     
     messages = [
@@ -73,12 +174,7 @@ def refine_playlist(description, current_playlist, refinement, removed_tracks):
         {"role": "user", "content": prompt}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=messages
-    )
-
-    return response.choices[0].message.content.strip().split('\n')
+    return chat_completion("gpt-4", messages, use_cache=use_cache).strip().split('\n')
 
 def get_song_details(description, songs):
     prompt = f"For each song in the following list, provide a brief explanation of why it was chosen and how it fits the theme: '{description}'. Format the response as 'Song - Artist: Explanation'"
@@ -89,84 +185,129 @@ def get_song_details(description, songs):
         {"role": "user", "content": f"{prompt}\n\n{songs_list}"}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages
-    )
-
-    return response.choices[0].message.content.strip().split('\n')
-
-def create_spotify_playlist(songs, playlist_name):
-    pl_id = spo.find_pl_id(playlist_name, create_missing=True)
-    print(f"playlist url: https://open.spotify.com/playlist/{pl_id}")
+    return chat_completion("gpt-4o", messages).strip().split('\n')
 
-    all_results = []
-    not_found = []
-
-    for song in songs:
-        results = spo.search(song, type="track", market='FR', limit=5)['tracks']['items']
-        if results:
-            formatted_results = [f"{' '.join([artist['name'] for artist in track['artists']])} - {track['name']}" for track in results]
-            all_results.append((song, formatted_results, results))
-        else:
-            not_found.append(song)
+def parse_llm_matches(content, chunk):
+    """
+    Read the {"query id": index} JSON object answered for a chunk of (query, formatted candidates, tracks) entries.
 
-    # Prepare data for LLM
-    llm_input = [{"query": query, "candidates": candidates} for query, candidates, _ in all_results]
+    Returns:
+        dict: Query id -> index, for the ids answered with an index in range (-1 meaning no match)
+    """
+    start, end = content.find('{'), content.rfind('}')
+    try:
+        answer = json.loads(content[start:end + 1]) if start != -1 else {}
+    except ValueError:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+    matches = {}
+    for query_id, (_, candidates, _) in enumerate(chunk):
+        index = answer.get(str(query_id))
+        if isinstance(index, int) and not isinstance(index, bool) and -1 <= index < len(candidates):
+            matches[query_id] = index
+    return matches
+
+def match_chunk_with_llm(chunk, max_retries=LLM_MATCH_RETRIES):
+    """Ask the LLM to match one chunk of entries, retrying the queries it left unanswered a bounded number of times."""
+    matches = {}
+    pending = list(range(len(chunk)))
+    for attempt in range(max_retries + 1):
+        entries = [chunk[query_id] for query_id in pending]
+        # One line per query, its candidates indented below it, to keep the prompt short
+        listing = "\n".join(
+            f"{query_id}. {query}\n" + "\n".join(f"  {index}: {candidate}" for index, candidate in enumerate(candidates))
+            for query_id, (query, candidates, _) in enumerate(entries)
+        )
+        prompt = f"""For each numbered query, pick the search result that is the most likely match, considering the artist names, the song title and whether it's a remix or the original version.
+Answer only with a JSON object mapping every query number to the index of its best result, or -1 if none is suitable, e.g. {{"0": 2, "1": -1}}.
+
+{listing}"""
+        messages = [
+            {"role": "system", "content": "You are a music expert helping to match song queries with search results."},
+            {"role": "user", "content": prompt}
+        ]
+        try:
+            # Only the first attempt may be answered from the cache: a retry needs a new answer
+            content = chat_completion("gpt-4o", messages, use_cache=attempt == 0) or ''
+        except Exception as e:
+            print(f"Error: LLM matching request failed. {str(e)}")
+            continue
+        answered = parse_llm_matches(content, entries)
+        for query_id, index in answered.items():
+            matches[pending[query_id]] = index
+        pending = [query_id for i, query_id in enumerate(pending) if i not in answered]
+        if not pending:
+            break
+        # An answer that left queries unanswered must not be replayed by the next run
+        llm_cache.invalidate(llm_cache.key("gpt-4o", messages))
+        if attempt < max_retries:
+            print(f"Retrying {len(pending)} unanswered queries... : {content}")
 
-    # Make a single call to the LLM
-    prompt = f"""Given a list of original queries and their corresponding search results, determine which result is the most likely match for each query. 
-    Consider factors like artist name, song title, and whether it's a remix or original version.
-    Return a list of indices (0-4) for the best matches, or -1 if none are suitable. The list should be in the same order as the input queries.
+    # Queries still unanswered after the retries are reported as not found
+    if pending:
+        print(f"No answer for {len(pending)} queries after {max_retries + 1} attempts, falling back to -1")
+    return [matches.get(query_id, -1) for query_id in range(len(chunk))]
 
-    Input:
-    {json.dumps(llm_input, indent=2)}
+def match_with_llm(all_results, chunk_size=LLM_MATCH_CHUNK_SIZE, max_workers=LLM_MATCH_CONCURRENCY):
+    """
+    Ask the LLM to pick the best search result of each (query, formatted candidates, tracks) entry.
 
-    Output:
-    Provide your response as a comma-separated list of integers, e.g.: 1,3,0,-1,2"""
+    Entries are matched in fixed-size chunks sent concurrently, so prompts stay
+    short and a bad answer only costs a retry of its own chunk.
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a music expert helping to match song queries with search results."},
-            {"role": "user", "content": prompt}
-        ]
+    Returns:
+        list: The index of the chosen candidate of each entry, or -1 if none matched
+    """
+    chunks = [all_results[i:i + chunk_size] for i in range(0, len(all_results), chunk_size)]
+    if not chunks:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunk_indices = list(executor.map(match_chunk_with_llm, chunks))
+    return [index for indices in chunk_indices for index in indices]
+
+def match_tracks(entries):
+    """Ask the LLM to pick the best track of each (song, tracks) entry, see match_with_llm."""
+    return match_with_llm([
+        (song, [f"{' '.join([artist['name'] for artist in track['artists']])} - {track['name']}" for track in tracks], tracks)
+        for song, tracks in entries
+    ])
+
+def make_track_resolver(max_workers=SPOTIFY_SEARCH_CONCURRENCY):
+    # A batch of songs is matched in one LLM chunk, several batches at a time
+    return TrackResolver(
+        spo, query=search_query, match=match_tracks, batch_size=LLM_MATCH_CHUNK_SIZE,
+        max_workers=max_workers, max_match_workers=LLM_MATCH_CONCURRENCY, type="track", market='FR', limit=5
     )
 
-    while True:
-        try:
-            best_indices = [int(index.strip()) for index in response.choices[0].message.content.split(',')]
-            if len(best_indices) != len(all_results):
-                raise ValueError("Number of indices doesn't match number of queries")
-            break  # Exit the loop if no exception is raised
-        except ValueError as e:
-            if "Number of indices doesn't match number of queries" in str(e):
-                print(f"Retrying due to mismatch in number of indices... : {response.choices[0].message.content}")
-                # Retry logic: request a new response from the LLM
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a music expert helping to match song queries with search results."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-            else:
-                print(f"Error: Unable to parse LLM response. {str(e)}")
-                best_indices = [-1] * len(all_results)
-                break
-        except AttributeError as e:
-            print(f"Error: Unable to parse LLM response. {str(e)}")
-            best_indices = [-1] * len(all_results)
-            break
+def create_spotify_playlist(songs, playlist_name, max_workers=SPOTIFY_SEARCH_CONCURRENCY, resolver=None):
+    pl_id = spo.find_pl_id(playlist_name, create_missing=True)
+    print(f"playlist url: https://open.spotify.com/playlist/{pl_id}")
+
+    not_found = []
 
-    # Process the LLM results and add tracks to the playlist
-    for (original_query, _, full_results), best_index in zip(all_results, best_indices):
-        if best_index != -1 and 0 <= best_index < len(full_results):
-            selected_track = full_results[best_index]
-            spo.pl_add_tr(pl_id, selected_track["id"])
-            print(f"Added: {original_query} -> {selected_track['artists'][0]['name']} - {selected_track['name']}")
+    # Songs are searched, ranked and matched by the LLM concurrently, and come back in song order.
+    # With the background resolver, most of them were resolved while the user was reviewing the playlist
+    if resolver is None:
+        own_resolver = make_track_resolver(max_workers)
+        resolutions = own_resolver.results(songs)
+        own_resolver.shutdown()
+    else:
+        resolutions = resolver.results(songs)
+
+    # Collect the selected tracks
+    selected_tracks = []
+    for song, (results, best_index) in zip(songs, resolutions):
+        if best_index is not None and 0 <= best_index < len(results):
+            selected_tracks.append((song, results[best_index]))
         else:
-            not_found.append(original_query)
+            not_found.append(song)
+
+    # Write everything at once, skipping tracks already in the playlist so reruns don't add duplicates
+    added_ids = set(spo.pl_add_missing_tr(pl_id, [track["id"] for _, track in selected_tracks]))
+    for original_query, selected_track in selected_tracks:
+        status = "Added" if selected_track["id"] in added_ids else "Already in playlist"
+        print(f"{status}: {original_query} -> {selected_track['artists'][0]['name']} - {selected_track['name']}")
 
     return not_found, pl_id
 
@@ -201,16 +342,11 @@ def format_songs_list(songs):
         {"role": "user", "content": f"{user_prompt}\n{songs_list}"}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages
-    )
-
-    return response.choices[0].message.content.strip().split('\n')
+    return chat_completion("gpt-4o", messages).strip().split('\n')
 
 def load_spotify_client():
-    # with st.spinner("Connecting to Spotify... Should take 10/20 seconds"):
-    st.session_state.spotify_client = MySpotify(access_token=st.session_state['spotify_token'])
+    # Creating the client is cheap: the user's playlists are loaded in the background
+    st.session_state.spotify_client = MySpotify(access_token=st.session_state['spotify_token'], warm_up=True)
     print('client created')
 
 if __name__=='__main__':
@@ -248,15 +384,8 @@ if __name__=='__main__':
 
     if 'spotify_token' in st.session_state:
         if 'spotify_client' not in st.session_state:
-            if not st.session_state.get('client_thread_started', False):
-                # Create a thread for loading the Spotify client
-                client_thread = threading.Thread(target=load_spotify_client)
-                # Attach Streamlit's context to the thread
-                add_script_run_ctx(client_thread)
-                # Start the thread
-                client_thread.start()
-                st.session_state.client_thread_started = True  # Mark the thread as started
-                st.session_state.step = 'enter_theme'  # Move to the next step immediately
+            load_spotify_client()
+            st.session_state.step = 'enter_theme'  # Move to the next step immediately
 
 
 
@@ -278,13 +407,37 @@ if __name__=='__main__':
                 placeholder="Example: Make a playlist of electronic music that reminds of water, waves and nature"
             )
             st.session_state.num_tracks = st.number_input("Number of tracks:", min_value=1, max_value=100, value=20)
+            # Suggestions are creative: every request gets new ones unless the user asks for the cached answer
+            st.session_state.reuse_suggestions = st.checkbox("Reuse cached suggestions for the same request", value=False)
             if st.button("Generate Playlist"):
                 if st.session_state.description:
                     st.session_state.step = 'generate_playlist'
 
         if st.session_state.step == 'generate_playlist':
             st.subheader("Generating playlist...")
-            title, st.session_state.songs = generate_playlist(st.session_state.description, st.session_state.num_tracks)
+            # Every song is resolved on Spotify in the background as soon as its line is streamed,
+            # and keeps resolving while the user reviews the playlist
+            if 'track_resolver' in st.session_state:
+                st.session_state.track_resolver.shutdown()
+            resolver = make_track_resolver()
+            st.session_state.track_resolver = resolver
+            streamed_songs = st.empty()
+            shown_songs = []
+
+            def show_song(song):
+                resolver.submit(song)
+                shown_songs.append(song)
+                streamed_songs.markdown("\n".join(f"- {shown}" for shown in shown_songs))
+
+            title, st.session_state.songs = generate_playlist(
+                st.session_state.description,
+                st.session_state.num_tracks,
+                use_cache=st.session_state.get('reuse_suggestions', False),
+                on_song=show_song
+            )
+            # The list is complete: match its last songs without waiting for a full batch
+            resolver.flush()
+            streamed_songs.empty()
             st.session_state.playlist_name = title  # Set the default playlist name
             st.session_state.step = 'display_playlist'
 
@@ -295,6 +448,9 @@ if __name__=='__main__':
                 col1.write(song)
                 if col2.button("➖", key=f"remove_{i}"):
                     st.session_state.removed_tracks.append(st.session_state.songs.pop(i))
+                    # Skip the resolution of the removed song, unless it is still listed elsewhere
+                    if 'track_resolver' in st.session_state:
+                        st.session_state.track_resolver.keep_only(st.session_state.songs)
                     st.rerun()
 
             refinement = st.text_input("Refine your playlist (e.g., 'Add more energetic tracks'):")
@@ -303,8 +459,15 @@ if __name__=='__main__':
                     st.session_state.description, 
                     "\n".join(st.session_state.songs), 
                     refinement,
-                    "\n".join(st.session_state.removed_tracks)
+                    "\n".join(st.session_state.removed_tracks),
+                    use_cache=st.session_state.get('reuse_suggestions', False)
                 )
+                # Resolve the new songs in the background and drop the ones the refinement removed
+                if 'track_resolver' in st.session_state:
+                    st.session_state.track_resolver.keep_only(st.session_state.songs)
+                    for song in st.session_state.songs:
+                        st.session_state.track_resolver.submit(song)
+                    st.session_state.track_resolver.flush()
                 st.rerun()
 
             if st.button("Add Details"):
@@ -313,8 +476,6 @@ if __name__=='__main__':
 
             st.session_state.playlist_name = st.text_input("Enter a name for your Spotify playlist:", value=st.session_state.playlist_name)
             if st.button("Create Spotify Playlist"):
-                formatted_songs = format_songs_list(st.session_state.songs)
-                st.session_state.songs = formatted_songs
                 st.session_state.step = 'creating_playlist'
 
         if st.session_state.step == 'display_details':
@@ -332,7 +493,11 @@ if __name__=='__main__':
                 st.write("Waiting for Spotify client to be ready...")
                 st.rerun()
             st.subheader("Creating Spotify playlist...")
-            not_found, pl_id = create_spotify_playlist(st.session_state.songs, st.session_state.playlist_name)
+            not_found, pl_id = create_spotify_playlist(
+                st.session_state.songs,
+                st.session_state.playlist_name,
+                resolver=st.session_state.get('track_resolver')
+            )
             
             st.success(f"Playlist '{st.session_state.playlist_name}' created successfully!")
             
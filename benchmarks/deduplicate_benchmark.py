@@ -0,0 +1,77 @@
+"""
+Benchmark of the track grouping used by deduplicate_tracks.
+
+Compares group_similar_tracks with the previous implementation, which scored
+each base name against every existing group, on a synthetic catalog of track
+names with remix, featuring and typo variants. Both must produce the same groups.
+
+Usage (from the repository root):
+    python -m benchmarks.deduplicate_benchmark [size]
+"""
+import random
+import string
+import sys
+import time
+
+from featurings_finder import get_base_track_name, group_similar_tracks, string_similarity
+
+
+def reference_group_similar_tracks(tracks, threshold=0.85):
+    """The previous O(n x groups) grouping loop."""
+    track_groups = {}
+    for track in tracks:
+        base_name = get_base_track_name(track['name'])
+        found_group = False
+        for group_name in list(track_groups.keys()):
+            if string_similarity(base_name, group_name) > threshold:
+                track_groups[group_name].append(track)
+                found_group = True
+                break
+        if not found_group:
+            track_groups[base_name] = [track]
+    return track_groups
+
+
+def make_tracks(size, seed=0):
+    """Build `size` tracks drawn from size/3 base titles and their variants."""
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 8))) for _ in range(3000)]
+    titles = [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))).title() for _ in range(max(1, size // 3))]
+    tracks = []
+    for i in range(size):
+        title = rng.choice(titles)
+        variant = rng.random()
+        if variant < 0.2:
+            title += ' - Remix'
+        elif variant < 0.3:
+            title += ' (feat. Someone)'
+        elif variant < 0.4:
+            position = rng.randint(0, len(title))
+            title = title[:position] + rng.choice(string.ascii_lowercase) + title[position + 1:]
+        tracks.append({'id': str(i), 'name': title})
+    return tracks
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    tracks = make_tracks(size)
+
+    start = time.perf_counter()
+    groups = group_similar_tracks(tracks)
+    indexed_time = time.perf_counter() - start
+    print(f"group_similar_tracks: {len(groups)} groups from {size} tracks in {indexed_time:.2f}s")
+
+    print("Running the previous implementation, this can take several minutes...")
+    start = time.perf_counter()
+    reference_groups = reference_group_similar_tracks(tracks)
+    reference_time = time.perf_counter() - start
+    print(f"reference: {len(reference_groups)} groups from {size} tracks in {reference_time:.2f}s")
+
+    if list(groups.items()) != list(reference_groups.items()):
+        print("Error: the groupings differ")
+        sys.exit(1)
+    print(f"Same groups, {reference_time / indexed_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
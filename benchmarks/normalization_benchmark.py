@@ -0,0 +1,107 @@
+"""
+Microbenchmark of the title normalization helpers.
+
+Compares Util.normalization with the previous per-call implementations of
+normalize_name, get_base_track_name, is_remix and should_keep_remix on a
+synthetic corpus of titles, each seen several times as in the dedupe and
+matching loops. Both implementations must give the same answers.
+
+Usage (from the repository root):
+    python -m benchmarks.normalization_benchmark [distinct_titles] [repeats]
+"""
+import random
+import re
+import string
+import sys
+import time
+
+import unidecode
+
+from Util import normalization
+
+
+def reference_normalize_name(foo):
+    foo = unidecode.unidecode(foo.lower())
+    to_cut = [' - ', ' (', ' [', ' (feat', ' (Feat', ' (Prod', ' (prod', ' (with', ' (from', ' (From', ' feat']
+    for i in to_cut: foo = foo.split(i)[0]
+    return foo
+
+
+def reference_get_base_track_name(track_name):
+    for delimiter in [' - ', ' (', ' [', ' feat', ' ft.', ' with']:
+        if delimiter in track_name:
+            track_name = track_name.split(delimiter)[0]
+    return track_name.lower().strip()
+
+
+def reference_is_remix(track_name, album_name):
+    if re.search(r'[-(\[]\s*.*(remix|mix|edit|version|extended|instrumental)', track_name, re.IGNORECASE):
+        return True
+    if 'remix' in album_name.lower():
+        return True
+    return False
+
+
+def reference_should_keep_remix(track_name, artist1_name, artist2_name):
+    parts = re.split(r'[-(\[]', track_name, 1)
+    if len(parts) < 2:
+        return False
+    suffix = parts[1].lower()
+    return artist1_name.lower() in suffix or artist2_name.lower() in suffix
+
+
+def make_titles(size, seed=0):
+    rng = random.Random(seed)
+    words = [''.join(rng.choice(string.ascii_letters) for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    suffixes = ['', '', ' - Remix', ' - Radio Edit', ' (feat. Drake)', ' [Extended Mix]', ' ft. Future',
+                ' (with Rihanna)', ' - 2011 Remaster', ' (Drake Remix)', ' (Instrumental)', ' - Live']
+    return [
+        ' '.join(rng.choice(words) for _ in range(rng.randint(1, 6))) + rng.choice(suffixes)
+        for _ in range(size)
+    ]
+
+
+def clear_caches():
+    normalization.parse_title.cache_clear()
+    normalization.normalize_name.cache_clear()
+
+
+def run(label, functions, titles):
+    normalize, base_name, remix, keep_remix = functions
+    start = time.perf_counter()
+    results = [
+        (normalize(title), base_name(title), remix(title, 'Album'), keep_remix(title, 'Drake', 'Rihanna'))
+        for title in titles
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {len(titles)} titles in {elapsed:.3f}s")
+    return results, elapsed
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    distinct = make_titles(size)
+    titles = distinct * repeats
+    random.Random(1).shuffle(titles)
+
+    reference = (reference_normalize_name, reference_get_base_track_name, reference_is_remix, reference_should_keep_remix)
+    optimized = (normalization.normalize_name, normalization.get_base_track_name,
+                 normalization.is_remix, normalization.should_keep_remix)
+
+    reference_results, reference_time = run("reference", reference, titles)
+    # Every timed run starts from empty caches, so the first lookup of each title is paid in both
+    clear_caches()
+    _, first_time = run("normalization, first sight of each title", optimized, distinct)
+    clear_caches()
+    results, elapsed = run("normalization, with repeats", optimized, titles)
+
+    if results != reference_results:
+        print("Error: the implementations disagree")
+        sys.exit(1)
+    print(f"Same results, {reference_time / elapsed:.1f}x faster with {repeats} lookups per title, "
+          f"{reference_time / repeats / first_time:.1f}x faster on the first lookup")
+
+
+if __name__ == "__main__":
+    main()
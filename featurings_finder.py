@@ -1,9 +1,13 @@
 from Util.MySpotify import MySpotify
+from Util.DiscographyCache import DiscographyCache
+from Util.tracks import DEFAULT_ALBUM_GROUPS, album_record, track_record
+from Util.normalization import get_base_track_name, is_remix, normalize_artist_name, should_keep_remix
 import os
 from dotenv import load_dotenv
 import sys
 from difflib import SequenceMatcher
-import re
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, defaultdict
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,60 +16,138 @@ def string_similarity(a, b):
     """Calculate the similarity ratio between two strings."""
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-def is_remix(track_name, album_name):
+class SimilarNameIndex:
     """
-    Determine if a track is a remix based on its name or album name.
+    Index of group names answering "which is the first name whose similarity with
+    this one is above the threshold", with the exact same answer as comparing the
+    name against every group with string_similarity, but without doing so.
     
-    Args:
-        track_name: The name of the track
-        album_name: The name of the album
-        
-    Returns:
-        bool: True if the track is identified as a remix, False otherwise
-    """
-    # Check for remix keywords in track name suffix or album
-    if re.search(r'[-(\[]\s*.*(remix|mix|edit|version|extended|instrumental)', track_name, re.IGNORECASE):
-        return True
-    if 'remix' in album_name.lower():
-        return True
-    return False
-
-def should_keep_remix(track_name, artist1_name, artist2_name):
+    SequenceMatcher's ratio is 2*M/T, where M is the number of matched characters
+    and T the sum of both lengths. Its matches are common substrings separated by
+    at least one unmatched character, so a ratio above the threshold needs
+    min(len_a, len_b) >= M, and the two names must share at least 3*M - T - 1
+    character bigrams. Candidates are looked up in a bigram inverted index through
+    the rarest bigrams of the name only (any name sharing enough bigrams must share
+    one of those), and only the candidates passing both bounds are scored.
     """
-    Determine if a remix should be kept based on whether it's remixed by one of our artists.
     
-    Args:
-        track_name: The name of the track
-        artist1_name: First artist name
-        artist2_name: Second artist name
+    def __init__(self, threshold=0.85):
+        self.threshold = threshold
+        self.names = []
+        self.lowered = []
+        self.bigrams = []
+        self.positions_by_length = defaultdict(list)
+        self.postings = defaultdict(list)  # bigram -> positions of the names containing it
+        self.required_cache = {}
+    
+    def bigram_counts(self, name):
+        return dict(Counter(name[i:i + 2] for i in range(len(name) - 1)))
+    
+    def min_shared_bigrams(self, len_a, len_b):
+        """
+        Return the number of bigrams two names of these lengths must share to
+        possibly be similar (<= 0 means no constraint), or None if they never can.
+        """
+        key = (len_a, len_b)
+        if key not in self.required_cache:
+            total = len_a + len_b
+            if total == 0:
+                required = 0
+            else:
+                # Smallest number of matched characters giving a ratio above the
+                # threshold, computed the way SequenceMatcher.ratio does
+                matches = max(0, int(self.threshold * total / 2) - 1)
+                while 2.0 * matches / total <= self.threshold:
+                    matches += 1
+                required = 3 * matches - total - 1 if matches <= min(len_a, len_b) else None
+            self.required_cache[key] = required
+        return self.required_cache[key]
+    
+    def add(self, name):
+        position = len(self.names)
+        lowered = name.lower()
+        bigrams = self.bigram_counts(lowered)
+        self.names.append(name)
+        self.lowered.append(lowered)
+        self.bigrams.append(bigrams)
+        self.positions_by_length[len(lowered)].append(position)
+        for bigram in bigrams:
+            self.postings[bigram].append(position)
+    
+    def candidates(self, lowered, bigrams):
+        """Positions of the names that pass the length and shared-bigram bounds."""
+        candidates = set()
+        min_required = None
+        for length, positions in self.positions_by_length.items():
+            required = self.min_shared_bigrams(len(lowered), length)
+            if required is None:
+                continue
+            if required <= 0:
+                # Very short names: the bigram bound says nothing, check them all
+                candidates.update(positions)
+            elif min_required is None or required < min_required:
+                min_required = required
+        if min_required is None:
+            return candidates
         
-    Returns:
-        bool: True if the remix should be kept, False otherwise
-    """
-    # Split track name to extract suffix
-    parts = re.split(r'[-(\[]', track_name, 1)
-    if len(parts) < 2:
-        return False
-    suffix = parts[1].lower()
-    # Check if either artist is in the suffix
-    return artist1_name.lower() in suffix or artist2_name.lower() in suffix
+        # A name sharing at least min_required bigrams shares one of the first
+        # (total - min_required + 1) bigram occurrences, so probe the rarest ones
+        prefix_size = sum(bigrams.values()) - min_required + 1
+        probed = set()
+        for bigram in sorted(bigrams, key=lambda bigram: len(self.postings.get(bigram, ()))):
+            if prefix_size <= 0:
+                break
+            prefix_size -= bigrams[bigram]
+            probed.update(self.postings.get(bigram, ()))
+        
+        for position in probed - candidates:
+            required = self.min_shared_bigrams(len(lowered), len(self.lowered[position]))
+            if required is None:
+                continue
+            indexed_bigrams = self.bigrams[position]
+            if sum(min(count, indexed_bigrams.get(bigram, 0)) for bigram, count in bigrams.items()) >= required:
+                candidates.add(position)
+        return candidates
+    
+    def find(self, name):
+        """Return the first indexed name similar to name, or None."""
+        lowered = name.lower()
+        for position in sorted(self.candidates(lowered, self.bigram_counts(lowered))):
+            # Same computation as string_similarity, with its cheap upper bound checked first
+            matcher = SequenceMatcher(None, lowered, self.lowered[position])
+            if matcher.quick_ratio() > self.threshold and matcher.ratio() > self.threshold:
+                return self.names[position]
+        return None
 
-def get_base_track_name(track_name):
+def group_similar_tracks(tracks, threshold=0.85):
     """
-    Get the base name of a track by removing any remix or feature information.
+    Group tracks whose base names are similar.
+    
+    Each track joins the first group whose name has a similarity above the
+    threshold with its own base name, or starts a new group.
     
     Args:
-        track_name: The full track name
+        tracks: List of track objects
+        threshold: Minimum string_similarity for two names to be grouped
         
     Returns:
-        str: The base track name
+        dict: Group name -> list of tracks, in order of appearance
     """
-    # Remove everything after these delimiters
-    for delimiter in [' - ', ' (', ' [', ' feat', ' ft.', ' with']:
-        if delimiter in track_name:
-            track_name = track_name.split(delimiter)[0]
+    track_groups = {}
+    index = SimilarNameIndex(threshold)
+    
+    for track in tracks:
+        base_name = get_base_track_name(track['name'])
+        group_name = index.find(base_name)
+        
+        # If no similar group found, create a new one
+        if group_name is None:
+            group_name = base_name
+            track_groups[group_name] = []
+            index.add(group_name)
+        track_groups[group_name].append(track)
     
-    return track_name.lower().strip()
+    return track_groups
 
 def deduplicate_tracks(tracks):
     """
@@ -83,22 +165,7 @@ def deduplicate_tracks(tracks):
     print("\nDeduplicating tracks with similar names...")
     
     # Group tracks by similar names
-    track_groups = {}
-    
-    for track in tracks:
-        base_name = get_base_track_name(track['name'])
-        
-        # Check if this track is similar to any existing group
-        found_group = False
-        for group_name in list(track_groups.keys()):
-            if string_similarity(base_name, group_name) > 0.85:  # High similarity threshold
-                track_groups[group_name].append(track)
-                found_group = True
-                break
-        
-        # If no similar group found, create a new one
-        if not found_group:
-            track_groups[base_name] = [track]
+    track_groups = group_similar_tracks(tracks, threshold=0.85)  # High similarity threshold
     
     # Print groups for debugging
     for base_name, group in track_groups.items():
@@ -129,11 +196,66 @@ def deduplicate_tracks(tracks):
     return deduplicated
 
 class FeaturingsFinder:
-    def __init__(self, spotify_client=None):
-        """Initialize the FeaturingsFinder with a Spotify client."""
+    def __init__(self, spotify_client=None, max_workers=8, cache=None, incremental_sync=False):
+        """
+        Initialize the FeaturingsFinder with a Spotify client.
+        
+        Args:
+            spotify_client: The Spotify client used for every API call
+            max_workers: Maximum number of concurrent requests when fetching album tracks
+            cache: Optional DiscographyCache that artist discographies are read through
+            incremental_sync: Default of get_artist_tracks' incremental mode
+        """
         self.spo = spotify_client
+        self.max_workers = max_workers
+        self.cache = cache
+        self.incremental_sync = incremental_sync
     
     def find_artist_id(self, artist_name):
+        """Return the ID of an artist, from the resolution cache or by searching for them."""
+        return self.find_artist_ids([artist_name])[artist_name]
+    
+    def find_artist_ids(self, artist_names):
+        """
+        Resolve many artist names at once.
+        
+        Cached names are read in a single lookup pass; only the misses are
+        searched, concurrently, and their results are cached.
+        
+        Args:
+            artist_names: List of artist names
+            
+        Returns:
+            dict: Artist name -> artist ID (None if not found)
+        """
+        resolved = {}
+        if self.cache:
+            cached = self.cache.get_artist_ids([normalize_artist_name(name) for name in artist_names])
+            for artist_name in artist_names:
+                artist_id = cached.get(normalize_artist_name(artist_name))
+                if artist_id:
+                    print(f"Found cached ID for {artist_name}: {artist_id}")
+                    resolved[artist_name] = artist_id
+        
+        misses = [artist_name for artist_name in dict.fromkeys(artist_names) if artist_name not in resolved]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for artist_name, artist_id in zip(misses, executor.map(self.search_artist_id, misses)):
+                resolved[artist_name] = artist_id
+                if artist_id and self.cache:
+                    self.cache.save_artist_id(normalize_artist_name(artist_name), artist_id)
+        return resolved
+    
+    def pin_artist_id(self, artist_name, artist_id):
+        """
+        Always resolve artist_name to artist_id, for names that the search gets wrong.
+
+        Pins are stored in the discography cache, so the finder must have one.
+        """
+        if self.cache is None:
+            raise ValueError("Pinning an artist ID requires a DiscographyCache")
+        self.cache.save_artist_id(normalize_artist_name(artist_name), artist_id, pinned=True)
+    
+    def search_artist_id(self, artist_name):
         """Search for an artist by name and return their ID."""
         results = self.spo.search(artist_name, type="artist", limit=10)
         if not results['artists']['items']:
@@ -165,48 +287,234 @@ class FeaturingsFinder:
         print(f"Selected best match for {artist_name}: {best_match['name']} (ID: {artist_id})")
         return artist_id
     
-    def get_artist_tracks(self, artist_id):
-        """Get all tracks associated with an artist."""
+    def get_artist_tracks(self, artist_id, refresh=False, incremental=None,
+                          album_groups=DEFAULT_ALBUM_GROUPS, first_page=None):
+        """
+        Get all tracks associated with an artist.
+        
+        Args:
+            artist_id: Spotify ID of the artist
+            refresh: If True, ignore the cached tracks and fetch the artist again
+            incremental: If True, an expired or refreshed cache entry is only
+                         completed with the releases published since it was
+                         crawled, instead of being crawled again from scratch.
+                         Defaults to the finder's incremental_sync
+            album_groups: The artist_albums groups to crawl, e.g. add 'appears_on'
+                          for the albums of other artists the artist appears on
+            first_page: First artist_albums page for album_groups, if already fetched
+            
+        Returns:
+            list: Track records (see Util.tracks)
+        """
+        if self.cache and not refresh:
+            cached = self.cache.get_artist(artist_id, album_groups)
+            if cached:
+                artist_name, albums, tracks = cached
+                print(f"Loaded {len(tracks)} cached tracks from {len(albums)} albums for: {artist_name} (ID: {artist_id})")
+                return tracks
+        
+        if incremental is None:
+            incremental = self.incremental_sync
+        if self.cache and incremental:
+            sync_state = self.cache.get_sync_state(artist_id)
+            # Groups that were never crawled have no known albums to stop at
+            if sync_state and set(album_groups) <= set(sync_state[1]):
+                return self.sync_artist_tracks(artist_id, *sync_state, album_groups=album_groups)
+        
         # Get artist details for verification
         artist_details = self.spo.artist(artist_id)
         print(f"Getting tracks for: {artist_details['name']} (ID: {artist_id})")
         
         # Get artist's albums
         albums = []
-        results = self.spo.artist_albums(artist_id, album_type='album,single', limit=50)
-        albums.extend(results['items'])
+        results = first_page or self.spo.artist_albums(artist_id, album_type=','.join(album_groups), limit=50)
+        albums.extend(album_record(album) for album in results['items'])
         while results['next']:
             results = self.spo.next(results)
-            albums.extend(results['items'])
+            albums.extend(album_record(album) for album in results['items'])
         
         print(f"Found {len(albums)} albums for artist ID: {artist_id}")
         
         # Get all tracks from all albums
-        tracks = []
-        for album in albums:
-            album_tracks = self.spo.album_tracks(album['id'])['items']
-            for track in album_tracks:
-                # Add album information and check if this artist is featured
-                track['album_name'] = album['name']
-                track['album_id'] = album['id']
-                track['release_date'] = album.get('release_date', 'Unknown')
-                tracks.append(track)
+        tracks = self.get_albums_tracks(albums)
         
         print(f"Found {len(tracks)} total tracks for artist ID: {artist_id}")
         # Print artists in a few tracks to debug
         if tracks:
             print("Sample track artists:")
             for i in range(min(3, len(tracks))):
-                artists_str = ", ".join([a['name'] for a in tracks[i]['artists']])
-                print(f"  - {tracks[i]['name']}: {artists_str}")
+                artists_str = ", ".join(tracks[i].artist_names)
+                print(f"  - {tracks[i].name}: {artists_str}")
+        
+        if self.cache:
+            self.cache.save_artist(artist_id, artist_details['name'], albums, tracks, album_groups)
         
         return tracks
     
-    def find_featurings(self, artist1_name, artist2_name, filter_remixes=False, deduplicate=False):
-        """Find tracks featuring both artists."""
+    def iter_artist_track_pages(self, artist_id):
+        """
+        Yield the tracks of an artist one page of albums at a time.
+        
+        A fresh cached discography is yielded as a single page, and so is an
+        expired one completed with its new releases when incremental_sync is on.
+        Otherwise each artist_albums page has its tracks fetched as soon as it is
+        listed, so a caller that stops iterating early also stops the crawl. Only
+        a crawl that runs to the end is saved to the cache.
+        
+        Args:
+            artist_id: Spotify ID of the artist
+            
+        Yields:
+            list: Track records (see Util.tracks)
+        """
+        if self.cache:
+            cached = self.cache.get_artist(artist_id)
+            if cached:
+                yield cached[2]
+                return
+            if self.incremental_sync:
+                sync_state = self.cache.get_sync_state(artist_id)
+                if sync_state and set(DEFAULT_ALBUM_GROUPS) <= set(sync_state[1]):
+                    yield self.sync_artist_tracks(artist_id, *sync_state)
+                    return
+        
+        artist_details = self.spo.artist(artist_id)
+        print(f"Streaming tracks for: {artist_details['name']} (ID: {artist_id})")
+        albums = []
+        tracks = []
+        results = self.spo.artist_albums(artist_id, album_type=','.join(DEFAULT_ALBUM_GROUPS), limit=50)
+        while True:
+            page_albums = [album_record(album) for album in results['items']]
+            page_tracks = self.get_albums_tracks(page_albums)
+            albums.extend(page_albums)
+            tracks.extend(page_tracks)
+            yield page_tracks
+            if not results['next']:
+                break
+            results = self.spo.next(results)
+        
+        if self.cache:
+            self.cache.save_artist(artist_id, artist_details['name'], albums, tracks)
+    
+    def sync_artist_tracks(self, artist_id, artist_name, crawled_groups, known_album_ids, newest_release_date,
+                           album_groups=DEFAULT_ALBUM_GROUPS):
+        """
+        Complete a cached discography with the releases published since it was crawled.
+        
+        Each album group is listed newest first, and walked only until it reaches
+        an album that is already known or older than the newest known release.
+        Only the new albums have their tracks fetched. Albums removed from
+        Spotify stay cached until the next full crawl.
+        
+        Args:
+            artist_id: Spotify ID of the artist
+            artist_name: Cached name of the artist
+            crawled_groups: The album groups of the cached discography, all synced
+            known_album_ids: Set of the cached album IDs
+            newest_release_date: Newest cached release date, or None
+            album_groups: The album groups whose tracks are returned
+            
+        Returns:
+            list: All tracks of the artist in album_groups, new releases first
+        """
+        print(f"Syncing new releases for: {artist_name} (ID: {artist_id})")
+        new_albums = []
+        for album_type in crawled_groups:
+            results = self.spo.artist_albums(artist_id, album_type=album_type, limit=50)
+            while True:
+                reached_known = False
+                for album in results['items']:
+                    release_date = album.get('release_date', '')
+                    # Dates can be a year, a month or a day: compare them at the shorter precision
+                    is_older = newest_release_date and release_date < newest_release_date[:len(release_date)]
+                    if album['id'] in known_album_ids or is_older:
+                        reached_known = True
+                        break
+                    new_albums.append(album_record(album))
+                if reached_known or not results['next']:
+                    break
+                results = self.spo.next(results)
+        
+        new_tracks = self.get_albums_tracks(new_albums)
+        print(f"Found {len(new_albums)} new albums with {len(new_tracks)} tracks for artist ID: {artist_id}")
+        return self.cache.add_albums(artist_id, new_albums, new_tracks, album_groups)
+    
+    def get_albums_tracks(self, albums):
+        """
+        Get the tracks of many albums using as few requests as possible.
+        
+        Albums are fetched 20 at a time through the multi-album endpoint, which
+        already embeds the first 50 tracks of each album. Only the albums with
+        more than 50 tracks need extra album_tracks pages. All requests run on a
+        bounded thread pool.
+        
+        Args:
+            albums: List of simplified album objects, as returned by artist_albums
+            
+        Returns:
+            list: Track records (see Util.tracks),
+                  in album order
+        """
+        batches = [albums[i:i + 20] for i in range(0, len(albums), 20)]
+        album_tracks = []  # Track records of each album, in album order
+        extra_pages = []  # (position in album_tracks, album, offset) of the pages beyond the first 50 tracks
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch_results = executor.map(lambda batch: self.spo.albums([album.id for album in batch])['albums'], batches)
+            for batch, full_albums in zip(batches, batch_results):
+                # Keep only the fields the finder uses, and let each batch's raw JSON go before reading the next one
+                for album, full_album in zip(batch, full_albums):
+                    if not full_album:
+                        continue
+                    album_tracks.append([track_record(track, album) for track in full_album['tracks']['items']])
+                    if full_album['tracks']['next']:
+                        extra_pages.extend(
+                            (len(album_tracks) - 1, album, offset)
+                            for offset in range(50, full_album['tracks']['total'], 50)
+                        )
+                del full_albums
+            
+            # Paginate only the albums whose tracks did not fit in the first page
+            pages = [
+                executor.submit(self.spo.album_tracks, album.id, limit=50, offset=offset)
+                for _, album, offset in extra_pages
+            ]
+            for (position, album, _), page in zip(extra_pages, pages):
+                album_tracks[position].extend(track_record(track, album) for track in page.result()['items'])
+        
+        return [track for tracks in album_tracks for track in tracks]
+    
+    def track_credits_artist(self, track, artist_id, artist_name, name_matches):
+        """
+        Check whether a track credits an artist, by ID first and by a close name otherwise.
+        
+        Args:
+            track: Track object with its list of artists
+            artist_id: Spotify ID of the artist to look for
+            artist_name: Name of the artist to look for
+            name_matches: Dict memoizing the name comparison for each credited artist name
+            
+        Returns:
+            bool: True if the artist is credited on the track
+        """
+        if artist_id in track.artist_ids:
+            return True
+        for credited_name in track.artist_names:
+            credited_name = credited_name.lower()
+            if credited_name not in name_matches:
+                name_matches[credited_name] = string_similarity(credited_name, artist_name) > 0.8
+            if name_matches[credited_name]:
+                return True
+        return False
+    
+    def find_featurings(self, artist1_name, artist2_name, filter_remixes=False, deduplicate=False, single_sided=False):
+        """Find tracks featuring both artists, crawling only the smaller catalog if single_sided."""
+        if single_sided:
+            return self.find_featurings_single_sided(artist1_name, artist2_name, filter_remixes, deduplicate)
+        
         # Find artist IDs
-        artist1_id = self.find_artist_id(artist1_name)
-        artist2_id = self.find_artist_id(artist2_name)
+        artist_ids = self.find_artist_ids([artist1_name, artist2_name])
+        artist1_id = artist_ids[artist1_name]
+        artist2_id = artist_ids[artist2_name]
         
         if not artist1_id or not artist2_id:
             return {"error": "One or both artists not found"}
@@ -220,21 +528,21 @@ class FeaturingsFinder:
         # Debug: Check if artists appear in each other's tracks
         print(f"\nChecking if {artist2_name} appears in {artist1_name}'s tracks...")
         for track in artist1_tracks[:10]:  # Check first 10 tracks
-            artist_names = [artist['name'].lower() for artist in track['artists']]
+            artist_names = [name.lower() for name in track.artist_names]
             if artist2_name.lower() in " ".join(artist_names):
-                print(f"Found {artist2_name} in {artist1_name}'s track: {track['name']}")
-                print(f"  Artists: {', '.join([a['name'] for a in track['artists']])}")
+                print(f"Found {artist2_name} in {artist1_name}'s track: {track.name}")
+                print(f"  Artists: {', '.join(track.artist_names)}")
         
         print(f"\nChecking if {artist1_name} appears in {artist2_name}'s tracks...")
         for track in artist2_tracks[:10]:  # Check first 10 tracks
-            artist_names = [artist['name'].lower() for artist in track['artists']]
+            artist_names = [name.lower() for name in track.artist_names]
             if artist1_name.lower() in " ".join(artist_names):
-                print(f"Found {artist1_name} in {artist2_name}'s track: {track['name']}")
-                print(f"  Artists: {', '.join([a['name'] for a in track['artists']])}")
+                print(f"Found {artist1_name} in {artist2_name}'s track: {track.name}")
+                print(f"  Artists: {', '.join(track.artist_names)}")
         
         # Extract track IDs for comparison
-        artist1_track_ids = {track['id'] for track in artist1_tracks}
-        artist2_track_ids = {track['id'] for track in artist2_tracks}
+        artist1_track_ids = {track.id for track in artist1_tracks}
+        artist2_track_ids = {track.id for track in artist2_tracks}
         
         print(f"\nTrack ID comparison:")
         print(f"  {artist1_name} has {len(artist1_track_ids)} unique track IDs")
@@ -244,64 +552,142 @@ class FeaturingsFinder:
         common_track_ids = artist1_track_ids.intersection(artist2_track_ids)
         print(f"  Common track IDs: {len(common_track_ids)}")
         
+        # Index both catalogs by track ID (keeping the first occurrence of each track)
+        artist1_tracks_by_id = {}
+        for track in artist1_tracks:
+            artist1_tracks_by_id.setdefault(track.id, track)
+        
         # Get full information for common tracks
         common_tracks = []
         for track_id in common_track_ids:
-            # Find the track in artist1's tracks (could use either artist's tracks)
-            track_info = next((track for track in artist1_tracks if track['id'] == track_id), None)
-            if track_info:
-                # Format the data for display
-                artists = ", ".join([artist['name'] for artist in track_info['artists']])
-                common_tracks.append({
-                    "track_id": track_id,
-                    "name": track_info['name'],
-                    "artists": artists,
-                    "album": track_info['album_name'],
-                    "release_date": track_info['release_date']
-                })
+            # Take the track from artist1's tracks (could use either artist's tracks)
+            track_info = artist1_tracks_by_id[track_id]
+            # Format the data for display
+            artists = ", ".join(track_info.artist_names)
+            common_tracks.append({
+                "track_id": track_id,
+                "name": track_info.name,
+                "artists": artists,
+                "album": track_info.album_name,
+                "release_date": track_info.release_date
+            })
         
-        # Check for collaborations based on artist names (additional method)
+        # Check for collaborations based on the credited artists (additional method)
         print("\nLooking for collaborations based on artist names...")
         name_based_collaborations = []
         
-        # Check artist1's tracks for artist2's name
-        for track in artist1_tracks:
-            artists_names = [a['name'].lower() for a in track['artists']]
-            # Check if artist2 is in the list of artists
-            if any(string_similarity(a, artist2_name) > 0.8 for a in artists_names):
-                artists = ", ".join([artist['name'] for artist in track['artists']])
-                collab = {
-                    "track_id": track['id'],
-                    "name": track['name'],
-                    "artists": artists,
-                    "album": track['album_name'],
-                    "release_date": track['release_date'],
-                    "found_in": f"{artist1_name}'s tracks"
-                }
-                if track['id'] not in common_track_ids:  # Avoid duplicates
-                    name_based_collaborations.append(collab)
-                    print(f"Found collaboration: {track['name']} by {artists}")
-        
-        # Check artist2's tracks for artist1's name
-        for track in artist2_tracks:
-            artists_names = [a['name'].lower() for a in track['artists']]
-            # Check if artist1 is in the list of artists
-            if any(string_similarity(a, artist1_name) > 0.8 for a in artists_names):
-                artists = ", ".join([artist['name'] for artist in track['artists']])
-                collab = {
-                    "track_id": track['id'],
-                    "name": track['name'],
-                    "artists": artists,
-                    "album": track['album_name'],
-                    "release_date": track['release_date'],
-                    "found_in": f"{artist2_name}'s tracks"
-                }
-                if track['id'] not in common_track_ids:  # Avoid duplicates
-                    name_based_collaborations.append(collab)
-                    print(f"Found collaboration: {track['name']} by {artists}")
+        # Check artist1's tracks for artist2, then artist2's tracks for artist1
+        for tracks, owner_name, other_id, other_name in (
+            (artist1_tracks, artist1_name, artist2_id, artist2_name),
+            (artist2_tracks, artist2_name, artist1_id, artist1_name),
+        ):
+            name_matches = {}  # Credited artist name -> whether it is close to other_name
+            for track in tracks:
+                if track.id in common_track_ids:  # Avoid duplicates
+                    continue
+                if self.track_credits_artist(track, other_id, other_name, name_matches):
+                    artists = ", ".join(track.artist_names)
+                    name_based_collaborations.append({
+                        "track_id": track.id,
+                        "name": track.name,
+                        "artists": artists,
+                        "album": track.album_name,
+                        "release_date": track.release_date,
+                        "found_in": f"{owner_name}'s tracks"
+                    })
+                    print(f"Found collaboration: {track.name} by {artists}")
         
         print(f"\nFound {len(name_based_collaborations)} additional collaborations by artist name")
         
+        return self.finish_featurings(
+            artist1_name, artist2_name, common_tracks, name_based_collaborations, filter_remixes, deduplicate
+        )
+
+    def find_featurings_single_sided(self, artist1_name, artist2_name, filter_remixes=False, deduplicate=False):
+        """
+        Find tracks featuring both artists by crawling only one of the catalogs.
+        
+        Simplified tracks list their artists with IDs, so every collaboration
+        shows up in either artist's catalog once the albums they appear on are
+        included. The first artist_albums page of each artist gives the size of
+        its catalog, and only the smaller one is crawled (continuing from that
+        page). A track is a collaboration when it credits the other artist by ID,
+        and, on an album the crawled artist only appears on, the crawled artist
+        too. Name-based matching is not done in this mode.
+        
+        Args:
+            artist1_name: First artist name
+            artist2_name: Second artist name
+            filter_remixes: If True, drop remixes not made by one of the artists
+            deduplicate: If True, keep one version of similar tracks
+            
+        Returns:
+            dict: Same format as find_featurings, with every match in common_tracks
+        """
+        artist_ids = self.find_artist_ids([artist1_name, artist2_name])
+        artist1_id = artist_ids[artist1_name]
+        artist2_id = artist_ids[artist2_name]
+        
+        if not artist1_id or not artist2_id:
+            return {"error": "One or both artists not found"}
+        
+        album_groups = DEFAULT_ALBUM_GROUPS + ('appears_on',)
+        owner_id, tracks = self.get_smaller_catalog_tracks([artist1_id, artist2_id], album_groups)
+        other_id = artist2_id if owner_id == artist1_id else artist1_id
+        
+        common_tracks = []
+        seen_track_ids = set()
+        for track in tracks:
+            if track.id in seen_track_ids or other_id not in track.artist_ids:
+                continue
+            if track.album_group == 'appears_on' and owner_id not in track.artist_ids:
+                continue
+            seen_track_ids.add(track.id)
+            common_tracks.append({
+                "track_id": track.id,
+                "name": track.name,
+                "artists": ", ".join(track.artist_names),
+                "album": track.album_name,
+                "release_date": track.release_date
+            })
+        print(f"\nFound {len(common_tracks)} collaborations by artist ID")
+        
+        return self.finish_featurings(artist1_name, artist2_name, common_tracks, [], filter_remixes, deduplicate)
+    
+    def get_smaller_catalog_tracks(self, artist_ids, album_groups):
+        """
+        Get the tracks of whichever artist has the fewest albums in album_groups.
+        
+        An artist already cached with these groups is used as is. Otherwise the
+        first artist_albums page of every artist is fetched concurrently, their
+        totals compared, and the smallest catalog crawled from its first page.
+        
+        Returns:
+            tuple: (ID of the crawled artist, its Track records)
+        """
+        if self.cache:
+            for artist_id in artist_ids:
+                cached = self.cache.get_artist(artist_id, album_groups)
+                if cached:
+                    print(f"Using the cached catalog of: {cached[0]} (ID: {artist_id})")
+                    return artist_id, cached[2]
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            first_pages = list(executor.map(
+                lambda artist_id: self.spo.artist_albums(artist_id, album_type=','.join(album_groups), limit=50),
+                artist_ids
+            ))
+        totals = [page['total'] for page in first_pages]
+        smallest = totals.index(min(totals))
+        print(f"Album counts: {totals}, crawling only artist ID: {artist_ids[smallest]}")
+        tracks = self.get_artist_tracks(
+            artist_ids[smallest], album_groups=album_groups, first_page=first_pages[smallest]
+        )
+        return artist_ids[smallest], tracks
+    
+    def finish_featurings(self, artist1_name, artist2_name, common_tracks, name_based_collaborations,
+                          filter_remixes, deduplicate):
+        """Filter and deduplicate the collaborations found, and format the result of find_featurings."""
         # Filter remixes if requested
         if filter_remixes:
             print("\nFiltering out unwanted remixes...")
@@ -349,6 +735,179 @@ class FeaturingsFinder:
             "total_count": len(common_tracks) + len(name_based_collaborations)
         }
 
+    def iter_featurings(self, artist1_name, artist2_name, filter_remixes=False, deduplicate=False, limit=None):
+        """
+        Yield the collaborations between two artists as their catalogs are crawled.
+        
+        artist1's albums are crawled page by page, then artist2's, and every track
+        crediting the other artist (by ID or by a close name) is yielded as soon as
+        its page is fetched. Crawling stops once `limit` collaborations have been
+        yielded, or as soon as the caller stops iterating.
+        
+        Args:
+            artist1_name: First artist name
+            artist2_name: Second artist name
+            filter_remixes: If True, skip remixes not made by one of the artists
+            deduplicate: If True, skip tracks similar to an already yielded one.
+                         Unlike find_featurings, the first version found is kept
+            limit: Maximum number of collaborations to yield, or None for all
+            
+        Yields:
+            dict: A collaboration, in the format of find_featurings' name_based_collaborations
+        """
+        if limit is not None and limit <= 0:
+            return
+        artist_ids = self.find_artist_ids([artist1_name, artist2_name])
+        artist1_id = artist_ids[artist1_name]
+        artist2_id = artist_ids[artist2_name]
+        if not artist1_id or not artist2_id:
+            print("One or both artists not found")
+            return
+        
+        seen_track_ids = set()
+        yielded_names = SimilarNameIndex()
+        count = 0
+        for owner_id, owner_name, other_id, other_name in (
+            (artist1_id, artist1_name, artist2_id, artist2_name),
+            (artist2_id, artist2_name, artist1_id, artist1_name),
+        ):
+            name_matches = {}  # Credited artist name -> whether it is close to other_name
+            for page in self.iter_artist_track_pages(owner_id):
+                for track in page:
+                    if track.id in seen_track_ids:
+                        continue
+                    seen_track_ids.add(track.id)
+                    if not self.track_credits_artist(track, other_id, other_name, name_matches):
+                        continue
+                    if (filter_remixes and is_remix(track.name, track.album_name)
+                            and not should_keep_remix(track.name, artist1_name, artist2_name)):
+                        continue
+                    if deduplicate:
+                        base_name = get_base_track_name(track.name)
+                        if yielded_names.find(base_name) is not None:
+                            continue
+                        yielded_names.add(base_name)
+                    
+                    yield {
+                        "track_id": track.id,
+                        "name": track.name,
+                        "artists": ", ".join(track.artist_names),
+                        "album": track.album_name,
+                        "release_date": track.release_date,
+                        "found_in": f"{owner_name}'s tracks"
+                    }
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+    
+    def has_collaborated(self, artist1_name, artist2_name):
+        """Return True as soon as one track crediting both artists is found."""
+        return next(self.iter_featurings(artist1_name, artist2_name, limit=1), None) is not None
+    
+    def find_collaboration_matrix(self, artist_names, filter_remixes=False, deduplicate=False):
+        """
+        Find the collaborations between every pair of artists in a roster.
+        
+        Each discography is fetched once. An inverted index maps every track ID to
+        the roster artists it belongs to (through their catalogs or its credited
+        artist IDs), and all pairs are read from it in a single pass.
+        
+        Args:
+            artist_names: List of artist names
+            filter_remixes: If True, drop remixes not made by one of the pair
+            deduplicate: If True, keep one version of similar tracks for each pair
+            
+        Returns:
+            dict: The resolved artist IDs, the artists that were not found, the
+                  names that resolved to the same artist as an earlier name
+                  (alias -> name kept in the roster), and one entry per pair of
+                  artists that collaborated
+        """
+        resolved = self.find_artist_ids(artist_names)
+        artist_ids = {}
+        not_found = []
+        duplicates = {}
+        roster_names = {}  # artist ID -> name kept in the roster
+        for artist_name in dict.fromkeys(artist_names):
+            artist_id = resolved[artist_name]
+            if not artist_id:
+                not_found.append(artist_name)
+            elif artist_id in roster_names:
+                duplicates[artist_name] = roster_names[artist_id]
+            else:
+                artist_ids[artist_name] = artist_id
+                roster_names[artist_id] = artist_name
+        roster = list(artist_ids.items())
+        roster_position = {artist_id: i for i, (_, artist_id) in enumerate(roster)}
+        
+        # Inverted index: track ID -> positions in the roster of the artists on the track
+        track_artists = defaultdict(set)
+        track_info = {}
+        for i, (artist_name, artist_id) in enumerate(roster):
+            print(f"\nGetting tracks for {artist_name}...")
+            for track in self.get_artist_tracks(artist_id):
+                track_info.setdefault(track.id, track)
+                track_artists[track.id].add(i)
+                for credited_id in track.artist_ids:
+                    if credited_id in roster_position:
+                        track_artists[track.id].add(roster_position[credited_id])
+        
+        # Read every pair off the index in one pass
+        pair_tracks = defaultdict(list)
+        for track_id, positions in track_artists.items():
+            if len(positions) < 2:
+                continue
+            track = track_info[track_id]
+            positions = sorted(positions)
+            for a, position1 in enumerate(positions):
+                for position2 in positions[a + 1:]:
+                    pair_tracks[(position1, position2)].append({
+                        "track_id": track_id,
+                        "name": track.name,
+                        "artists": ", ".join(track.artist_names),
+                        "album": track.album_name,
+                        "release_date": track.release_date
+                    })
+        
+        collaborations = []
+        for (position1, position2), tracks in sorted(pair_tracks.items()):
+            artist1_name, artist2_name = roster[position1][0], roster[position2][0]
+            if filter_remixes:
+                tracks = [
+                    track for track in tracks
+                    if not is_remix(track["name"], track["album"])
+                    or should_keep_remix(track["name"], artist1_name, artist2_name)
+                ]
+            if deduplicate:
+                tracks = deduplicate_tracks(tracks)
+            if tracks:
+                collaborations.append({
+                    "artist1": artist1_name,
+                    "artist2": artist2_name,
+                    "tracks": tracks,
+                    "total_count": len(tracks)
+                })
+        
+        return {
+            "artists": artist_ids,
+            "not_found": not_found,
+            "duplicates": duplicates,
+            "collaborations": collaborations
+        }
+
+def parse_cli_args(args):
+    """
+    Split the command line into artist names and the optional remix filtering and
+    deduplication flags, which are the trailing true/false words after at least two names.
+    """
+    flag_words = ['true', 't', 'yes', 'y', '1', 'false', 'f', 'no', 'n', '0']
+    names = list(args)
+    flags = []
+    while len(names) > 2 and len(flags) < 2 and names[-1].lower() in flag_words:
+        flags.insert(0, names.pop())
+    flags = [flag.lower() in ['true', 't', 'yes', 'y', '1'] for flag in flags]
+    return names, flags
+
 def main():
     """Main function to run when the script is executed directly."""
     # Check for required environment variables
@@ -382,24 +941,56 @@ def main():
             print("Or set SPOTIFY_ACCESS_TOKEN directly in your .env file")
             sys.exit(1)
             
+        # Discographies are cached on disk so repeated lookups skip the crawl
+        cache = DiscographyCache(
+            path=os.getenv('DISCOGRAPHY_CACHE_PATH', 'discography_cache.sqlite'),
+            ttl=float(os.getenv('DISCOGRAPHY_CACHE_TTL', 7 * 24 * 3600))
+        )
+        
+        # Expired discographies are only completed with their new releases unless disabled
+        incremental_sync = os.getenv('DISCOGRAPHY_CACHE_INCREMENTAL', 'true').lower() != 'false'
+        
         # Initialize FeaturingsFinder
-        finder = FeaturingsFinder(spotify_client=spotify)
+        finder = FeaturingsFinder(spotify_client=spotify, cache=cache, incremental_sync=incremental_sync)
         
         # Get artist names from command line args or use defaults
-        artist1 = "Rihanna"
-        artist2 = "Drake"
+        artist_names = ["Rihanna", "Drake"]
         filter_remixes = True    # Enable remix filtering by default
         deduplicate_tracks = True  # Enable track deduplication by default
         
         if len(sys.argv) >= 3:
-            artist1 = sys.argv[1]
-            artist2 = sys.argv[2]
-            # If a fourth argument is provided, use it as a flag for remix filtering
-            if len(sys.argv) >= 4:
-                filter_remixes = sys.argv[3].lower() in ['true', 't', 'yes', 'y', '1']
-            # If a fifth argument is provided, use it as a flag for deduplication
-            if len(sys.argv) >= 5:
-                deduplicate_tracks = sys.argv[4].lower() in ['true', 't', 'yes', 'y', '1']
+            artist_names, flags = parse_cli_args(sys.argv[1:])
+            # Optional trailing flags: remix filtering, then deduplication
+            if len(flags) >= 1:
+                filter_remixes = flags[0]
+            if len(flags) >= 2:
+                deduplicate_tracks = flags[1]
+        
+        if len(artist_names) > 2:
+            print(f"Searching for collaborations between {', '.join(artist_names)}...")
+            print(f"Remix filtering: {'Enabled' if filter_remixes else 'Disabled'}")
+            print(f"Track deduplication: {'Enabled' if deduplicate_tracks else 'Disabled'}")
+            
+            matrix = finder.find_collaboration_matrix(
+                artist_names,
+                filter_remixes=filter_remixes,
+                deduplicate=deduplicate_tracks
+            )
+            for artist_name in matrix['not_found']:
+                print(f"Warning: {artist_name} was not found")
+            for alias, artist_name in matrix['duplicates'].items():
+                print(f"Warning: {alias} is the same artist as {artist_name}")
+            
+            print(f"\nCollaborations between {len(matrix['artists'])} artists:")
+            if not matrix['collaborations']:
+                print("\nNo collaborations found.")
+            for pair in matrix['collaborations']:
+                print(f"\n{pair['artist1']} x {pair['artist2']}: {pair['total_count']} tracks")
+                for i, track in enumerate(pair['tracks'], 1):
+                    print(f"  {i}. {track['name']} ({track['artists']}) - {track['album']}, {track['release_date']}")
+            return
+        
+        artist1, artist2 = artist_names
         
         print(f"Searching for collaborations between {artist1} and {artist2}...")
         print(f"Remix filtering: {'Enabled' if filter_remixes else 'Disabled'}")